@@ -0,0 +1,66 @@
+"""Awaitable facade over database.py for code running on the event loop.
+
+Calls are queued onto one dedicated DB thread (a single-worker executor
+and its request queue), so an fsync or a lock wait in SQLite never
+stalls the asyncio loop, and that thread reuses one pooled connection.
+Synchronous callers that already run off the loop (tool execution in
+worker threads, scripts) keep using database.py directly.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import metrics
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tralfaz-db")
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking database function on the DB thread and await it."""
+    loop = asyncio.get_running_loop()
+    # Includes time queued behind other DB jobs, which is what callers feel.
+    with metrics.span(f"db.{fn.__name__}"):
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+store_message = _awaitable(database.store_message)
+get_history = _awaitable(database.get_history)
+get_last_assistant_message = _awaitable(database.get_last_assistant_message)
+clear_history = _awaitable(database.clear_history)
+get_unsummarized_messages = _awaitable(database.get_unsummarized_messages)
+get_chat_summary = _awaitable(database.get_chat_summary)
+save_chat_summary = _awaitable(database.save_chat_summary)
+save_appointment = _awaitable(database.save_appointment)
+list_appointments = _awaitable(database.list_appointments)
+get_todays_appointments = _awaitable(database.get_todays_appointments)
+get_tomorrows_appointments = _awaitable(database.get_tomorrows_appointments)
+get_appointments_on = _awaitable(database.get_appointments_on)
+cancel_appointment = _awaitable(database.cancel_appointment)
+get_appointment = _awaitable(database.get_appointment)
+set_google_event_id = _awaitable(database.set_google_event_id)
+get_due_reminders = _awaitable(database.get_due_reminders)
+get_upcoming_reminders = _awaitable(database.get_upcoming_reminders)
+get_unreminded_appointment = _awaitable(database.get_unreminded_appointment)
+mark_reminded = _awaitable(database.mark_reminded)
+get_voice_file_id = _awaitable(database.get_voice_file_id)
+set_voice_file_id = _awaitable(database.set_voice_file_id)
+delete_voice_file_id = _awaitable(database.delete_voice_file_id)
+get_briefing_schedules = _awaitable(database.get_briefing_schedules)
+get_briefing_schedule = _awaitable(database.get_briefing_schedule)
+set_briefing_schedule = _awaitable(database.set_briefing_schedule)
+claim_briefing = _awaitable(database.claim_briefing)
+
+
+def shutdown():
+    """Drain queued requests and stop the DB thread."""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,21 @@
+"""Fire-and-forget tasks for the background schedulers (reminders, briefings)."""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def spawn(tasks: set[asyncio.Task], coro, description: str) -> asyncio.Task:
+    """Run coro as a task kept in tasks until it finishes, logging any exception."""
+
+    async def logged():
+        try:
+            await coro
+        except Exception:
+            logger.exception("Error in %s", description)
+
+    task = asyncio.create_task(logged())
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
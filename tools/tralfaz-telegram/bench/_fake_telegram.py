@@ -0,0 +1,62 @@
+"""Duck-typed stand-ins for the telegram objects the handlers touch.
+
+Enough of Update/Message/Bot for calling handler coroutines directly,
+without a Telegram server. Sends are recorded with a timestamp.
+"""
+
+import itertools
+import time
+from types import SimpleNamespace
+
+_message_ids = itertools.count(1)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def _record(self, kind, chat_id, payload):
+        self.sent.append((time.perf_counter(), kind, chat_id, payload))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._record("text", chat_id, text)
+        return FakeMessage(self, chat_id, text)
+
+    async def send_voice(self, chat_id, voice, **kwargs):
+        self._record("voice", chat_id, voice)
+        return SimpleNamespace(voice=SimpleNamespace(file_id=f"voice-{next(_message_ids)}"))
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = ""):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.message_id = next(_message_ids)
+        self.text = text
+        self.chat = SimpleNamespace(id=chat_id, send_action=self._send_action)
+
+    async def _send_action(self, action):
+        pass
+
+    def get_bot(self):
+        return self._bot
+
+    async def reply_text(self, text, **kwargs):
+        return await self._bot.send_message(self.chat_id, text)
+
+    async def edit_text(self, text, **kwargs):
+        self._bot._record("edit", self.chat_id, text)
+        self.text = text
+        return self
+
+
+def make_update(bot: FakeBot, chat_id: int, text: str):
+    message = FakeMessage(bot, chat_id, text)
+    return SimpleNamespace(
+        message=message,
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=SimpleNamespace(id=chat_id),
+    )
@@ -0,0 +1,38 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Puts the bot modules on sys.path and fills in dummy API keys so that
+importing config doesn't exit. Benchmarks never talk to the real APIs.
+"""
+
+import os
+import sys
+import tempfile
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+for _var in ("TELEGRAM_BOT_TOKEN", "ANTHROPIC_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_var, "bench")
+
+
+def temp_db_path(name: str = "bench.db") -> str:
+    """Return a DB path in a fresh temp directory."""
+    return os.path.join(tempfile.mkdtemp(prefix="tralfaz-bench-"), name)
+
+
+def use_temp_db(name: str = "bench.db") -> str:
+    """Point database.py at a fresh temp DB and create the schema."""
+    import database
+
+    database.close_connections()
+    database.DB_PATH = temp_db_path(name)
+    database.init_db()
+    return database.DB_PATH
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,363 @@
+"""Local stand-in HTTP(S) servers for the benchmarks.
+
+StubServer runs a ThreadingHTTPServer on 127.0.0.1 in a background
+thread. Requests are answered by a route function
+``route(method, path, headers, body) -> (status, headers, body)`` after
+an optional injected latency, over HTTP/1.1 with keep-alive.
+"""
+
+import email.parser
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def make_self_signed_cert() -> tuple[str, str]:
+    """Create a throwaway localhost cert/key pair with the openssl CLI."""
+    directory = tempfile.mkdtemp(prefix="tralfaz-stub-tls-")
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1",
+            "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        status, headers, payload = server.route(self.command, self.path, self.headers, body)
+        if callable(payload):
+            # Streaming body: payload(write) emits chunks itself.
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write(chunk: bytes):
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+
+            payload(write)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+            return
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_DELETE = _handle
+
+
+class StubServer:
+    def __init__(self, route, latency: float = 0.0, tls: bool = False):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.route = route
+        self._httpd.latency = latency
+        self.cafile = None
+        if tls:
+            cert, key = make_self_signed_cert()
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+            self.cafile = cert
+        self.scheme = "https" if tls else "http"
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://localhost:{self.port}"
+
+    @property
+    def latency(self) -> float:
+        return self._httpd.latency
+
+    @latency.setter
+    def latency(self, value: float):
+        self._httpd.latency = value
+
+    def client_ssl_context(self) -> ssl.SSLContext:
+        return ssl.create_default_context(cafile=self.cafile)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# --- Fake Anthropic Messages API ---
+
+
+def _sse(name: str, data: dict) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class FakeAnthropic:
+    """Answers POST /v1/messages, streaming or not.
+
+    reply may be a string or a callable taking the request number, e.g.
+    to keep replies unique so the TTS cache doesn't hide synthesis time.
+    With tool set to (name, input), a plain user turn gets a tool_use
+    response first and the follow-up turn carrying the tool_result gets
+    the text reply, as a real tool round trip would.
+
+    Prompt caching is simulated: the prefix up to each cache_control
+    breakpoint is remembered, and usage reports cache reads and writes
+    with tokens estimated at four characters each.
+    """
+
+    def __init__(self, reply="Very good, Sir. It shall be done.", tool=None, token_delay: float = 0.0):
+        self.reply = reply
+        self.tool = tool
+        self.token_delay = token_delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._cached_prefixes: set[str] = set()
+
+    def _wants_tool(self, request: dict) -> bool:
+        if not self.tool or "tools" not in request:
+            return False
+        last = request["messages"][-1]["content"]
+        return isinstance(last, str) or all(block.get("type") == "text" for block in last)
+
+    def _usage(self, request: dict) -> dict:
+        system = request.get("system", [])
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        blocks = list(request.get("tools", [])) + list(system)
+        for message in request["messages"]:
+            content = message["content"]
+            blocks.extend([{"type": "text", "text": content}] if isinstance(content, str) else content)
+
+        # Like the real API, a breakpoint also matches a cached prefix that
+        # ends at any earlier block boundary.
+        prefix, total, read, written = "", 0, 0, 0
+        boundaries, breakpoints = [], []
+        for block in blocks:
+            text = json.dumps({k: v for k, v in block.items() if k != "cache_control"}, sort_keys=True)
+            prefix += text
+            total += len(text) // 4
+            boundaries.append((prefix, total))
+            if "cache_control" in block:
+                breakpoints.append((prefix, total))
+        with self._lock:
+            if breakpoints:
+                last_breakpoint = breakpoints[-1][1]
+                for key, tokens in boundaries:
+                    if tokens <= last_breakpoint and key in self._cached_prefixes:
+                        read = tokens
+            for key, tokens in breakpoints:
+                self._cached_prefixes.add(key)
+            if breakpoints:
+                written = max(breakpoints[-1][1] - read, 0)
+        return {
+            "input_tokens": total - read - written,
+            "output_tokens": 20,
+            "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": written,
+        }
+
+    def _content(self, request: dict) -> tuple[list[dict], str]:
+        if self._wants_tool(request):
+            name, tool_input = self.tool
+            content = [
+                {"type": "text", "text": "One moment, Sir."},
+                {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": name, "input": tool_input},
+            ]
+            return content, "tool_use"
+        reply = self.reply(self.requests) if callable(self.reply) else self.reply
+        return [{"type": "text", "text": reply}], "end_turn"
+
+    def route(self, method, path, headers, body):
+        with self._lock:
+            self.requests += 1
+        request = json.loads(body)
+        content, stop_reason = self._content(request)
+        usage = self._usage(request)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "fake"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if not request.get("stream"):
+            return 200, {"Content-Type": "application/json"}, json.dumps(message).encode()
+
+        def stream(write):
+            start = dict(message, content=[], stop_reason=None)
+            write(_sse("message_start", {"type": "message_start", "message": start}))
+            for index, block in enumerate(content):
+                if block["type"] == "text":
+                    write(_sse("content_block_start", {
+                        "type": "content_block_start", "index": index,
+                        "content_block": {"type": "text", "text": ""},
+                    }))
+                    for word in block["text"].split(" "):
+                        if self.token_delay:
+                            time.sleep(self.token_delay)
+                        write(_sse("content_block_delta", {
+                            "type": "content_block_delta", "index": index,
+                            "delta": {"type": "text_delta", "text": word + " "},
+                        }))
+                else:
+                    write(_sse("content_block_start", {
+                        "type": "content_block_start", "index": index,
+                        "content_block": dict(block, input={}),
+                    }))
+                    write(_sse("content_block_delta", {
+                        "type": "content_block_delta", "index": index,
+                        "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])},
+                    }))
+                write(_sse("content_block_stop", {"type": "content_block_stop", "index": index}))
+            write(_sse("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            }))
+            write(_sse("message_stop", {"type": "message_stop"}))
+
+        return 200, {"Content-Type": "text/event-stream"}, stream
+
+
+# --- Fake OpenAI speech endpoints ---
+
+FAKE_OPUS = b"OggS" + b"\0" * 8 * 1024
+
+
+def openai_speech_route(method, path, headers, body, transcript: str = "What is on tomorrow?"):
+    if path.endswith("/audio/transcriptions"):
+        return 200, {"Content-Type": "application/json"}, json.dumps({"text": transcript}).encode()
+    return 200, {"Content-Type": "audio/ogg"}, FAKE_OPUS
+
+
+# --- Fake Telegram Bot API ---
+
+
+def _form_fields(headers, body: bytes) -> dict:
+    content_type = headers.get("Content-Type", "")
+    if content_type.startswith("multipart/"):
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        fields = {}
+        for part in message.get_payload():
+            if part.get_filename() is None:
+                fields[part.get_param("name", header="content-disposition")] = part.get_payload(decode=True).decode()
+        return fields
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+
+class FakeTelegram:
+    """Answers the Bot API methods the bot uses, plus file downloads.
+
+    Point telegram.Bot at it with base_url=f"{server.url}/bot" and
+    base_file_url=f"{server.url}/file/bot". Every call is recorded in
+    events as (perf_counter, method, chat_id, text). Updates queued with
+    push_update are served to getUpdates long polls.
+    """
+
+    def __init__(self, voice_note: bytes = FAKE_OPUS):
+        self.voice_note = voice_note
+        self.events = []
+        self._lock = threading.Lock()
+        self._ids = iter(range(1, 2**31))
+        self._updates: list[dict] = []
+        self._updates_changed = threading.Condition()
+
+    def push_update(self, update: dict):
+        with self._updates_changed:
+            self._updates.append(update)
+            self._updates_changed.notify_all()
+
+    def _get_updates(self, fields: dict) -> list[dict]:
+        offset = int(fields.get("offset") or 0)
+        limit = int(fields.get("limit") or 100)
+        deadline = time.monotonic() + float(fields.get("timeout") or 0)
+        with self._updates_changed:
+            while True:
+                # Confirmed updates (below offset) are dropped, as the real API does.
+                self._updates = [update for update in self._updates if update["update_id"] >= offset]
+                if self._updates or time.monotonic() >= deadline:
+                    return self._updates[:limit]
+                self._updates_changed.wait(deadline - time.monotonic())
+
+    def _next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def _message(self, chat_id, **fields) -> dict:
+        return {
+            "message_id": self._next_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            **fields,
+        }
+
+    def route(self, method, path, headers, body):
+        if path.startswith("/file/"):
+            self.events.append((time.perf_counter(), "download", None, None))
+            return 200, {"Content-Type": "application/octet-stream"}, self.voice_note
+
+        api_method = path.rsplit("/", 1)[-1]
+        fields = _form_fields(headers, body)
+        chat_id = fields.get("chat_id")
+        result = True
+        if api_method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Tralfaz", "username": "tralfaz_bench_bot"}
+        elif api_method == "getUpdates":
+            result = self._get_updates(fields)
+        elif api_method in ("sendMessage", "editMessageText"):
+            result = self._message(chat_id, text=fields.get("text", ""))
+        elif api_method == "sendVoice":
+            file_id = f"voice-{self._next_id()}"
+            result = self._message(chat_id, voice={"file_id": file_id, "file_unique_id": file_id, "duration": 1})
+        elif api_method == "getFile":
+            result = {
+                "file_id": fields.get("file_id"),
+                "file_unique_id": fields.get("file_id"),
+                "file_size": len(self.voice_note),
+                "file_path": f"voice/{fields.get('file_id')}.oga",
+            }
+        self.events.append((time.perf_counter(), api_method, chat_id and int(chat_id), fields.get("text")))
+        return 200, {"Content-Type": "application/json"}, json.dumps({"ok": True, "result": result}).encode()
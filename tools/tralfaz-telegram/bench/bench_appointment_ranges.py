@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark: per-chat today/tomorrow/upcoming lookups on a busy chat.
+
+Fills a temp DB where one chat owns a large share of the appointments
+(spread over two years around today), then times the old date()/string
+queries against the (chat_id, start_epoch) range queries in database.
+
+    python bench/bench_appointment_ranges.py [rows] [heavy_chat_rows] [runs]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import _setup
+
+import database
+
+HEAVY_CHAT = 42
+
+LEGACY_QUERIES = {
+    "today": """
+        SELECT id, title, datetime, reminder_minutes_before FROM appointments
+        WHERE chat_id = ? AND date(datetime) = date('now', 'localtime')
+        ORDER BY datetime ASC
+    """,
+    "tomorrow": """
+        SELECT id, title, datetime, reminder_minutes_before FROM appointments
+        WHERE chat_id = ? AND date(datetime) = date('now', 'localtime', '+1 day')
+        ORDER BY datetime ASC
+    """,
+    "upcoming": """
+        SELECT id, title, datetime, reminder_minutes_before, google_event_id FROM appointments
+        WHERE chat_id = ? AND datetime >= datetime('now', 'localtime')
+        ORDER BY datetime ASC
+    """,
+}
+
+RANGE_QUERIES = {
+    "today": database.get_todays_appointments,
+    "tomorrow": database.get_tomorrows_appointments,
+    "upcoming": database.list_appointments,
+}
+
+
+def _fill(rows: int, heavy_rows: int):
+    rng = random.Random(13)
+    now = datetime.now(database._TZ).replace(tzinfo=None, second=0, microsecond=0)
+    conn = database.get_connection()
+    batch = []
+    for i in range(rows):
+        chat_id = HEAVY_CHAT if i < heavy_rows else rng.randint(1000, 6000)
+        start = now + timedelta(minutes=rng.randint(-365 * 24 * 60, 365 * 24 * 60))
+        dt = start.isoformat()
+        batch.append((chat_id, f"Appointment {i}", dt, 15, int(start < now), *database.appointment_epochs(dt, 15)))
+        if len(batch) == 50000:
+            _insert(conn, batch)
+            batch = []
+    _insert(conn, batch)
+    conn.execute("ANALYZE")
+
+
+def _insert(conn, batch):
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO appointments
+                (chat_id, title, datetime, reminder_minutes_before, reminded, start_epoch, remind_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch,
+        )
+
+
+def _time(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, len(result)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    heavy_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    _setup.use_temp_db()
+
+    start = time.perf_counter()
+    _fill(rows, heavy_rows)
+    print(f"Inserted {rows:,} appointments ({heavy_rows:,} in chat {HEAVY_CHAT}) in {time.perf_counter() - start:.1f}s")
+
+    conn = database.get_connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM appointments WHERE chat_id = ? AND start_epoch >= ? AND start_epoch < ? ORDER BY start_epoch",
+        (0, 0, 0),
+    ).fetchall()
+    print(f"  plan: {' / '.join(row[3] for row in plan)}")
+
+    for name, legacy_sql in LEGACY_QUERIES.items():
+        legacy, legacy_hits = _time(lambda: conn.execute(legacy_sql, (HEAVY_CHAT,)).fetchall(), runs)
+        ranged, ranged_hits = _time(lambda: RANGE_QUERIES[name](HEAVY_CHAT), runs)
+        print(
+            f"  {name:<9} legacy p50 {_setup.percentile(legacy, 50):9.3f} ms ({legacy_hits} rows)"
+            f"   range p50 {_setup.percentile(ranged, 50):9.3f} ms ({ranged_hits} rows)"
+        )
+
+
+if __name__ == "__main__":
+    main()
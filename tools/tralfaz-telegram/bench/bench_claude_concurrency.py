@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Load test: text turns across many chats against a local fake Anthropic API.
+
+Each simulated chat sends a few messages back to back through
+handlers.handle_text. Claude and TTS are served by local stubs with
+injected latency. Throughput is measured once with every update
+processed one at a time (how the bot ran before concurrent updates) and
+then with all chats in flight at once, for growing chat counts.
+
+    python bench/bench_claude_concurrency.py [claude_latency_ms] [turns_per_chat]
+"""
+
+import asyncio
+import sys
+import time
+
+import anthropic
+
+import _setup
+from _fake_telegram import FakeBot, make_update
+from _stubs import FakeAnthropic, StubServer, openai_speech_route
+
+import claude_client
+import handlers
+import voice
+
+CHAT_COUNTS = (1, 2, 4, 8, 16, 32)
+
+
+async def _chat(bot, chat_id, turns):
+    for turn in range(turns):
+        await handlers.handle_text(make_update(bot, chat_id, f"Note number {turn}, please."), None)
+
+
+async def _sequential(bot, chats, turns):
+    for chat_id in range(1, chats + 1):
+        await _chat(bot, chat_id, turns)
+
+
+async def _concurrent(bot, chats, turns):
+    await asyncio.gather(*(_chat(bot, chat_id, turns) for chat_id in range(1, chats + 1)))
+
+
+async def main():
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.2
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    _setup.use_temp_db()
+
+    fake = FakeAnthropic()
+    with StubServer(fake.route, latency=latency) as claude_server, StubServer(openai_speech_route) as speech_server:
+        claude_client._client = anthropic.AsyncAnthropic(api_key="bench", base_url=claude_server.url)
+        voice.TTS_URL = f"{speech_server.url}/v1/audio/speech"
+
+        print(f"{turns} turns per chat, {latency * 1000:.0f} ms fake Claude latency, "
+              f"CLAUDE_MAX_CONCURRENCY={claude_client._semaphore._value}")
+        print(f"  {'chats':>5}  {'sequential':>14}  {'concurrent':>14}")
+        for chats in CHAT_COUNTS:
+            bot = FakeBot()
+            start = time.perf_counter()
+            await _sequential(bot, chats, turns)
+            sequential = chats * turns / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await _concurrent(bot, chats, turns)
+            concurrent = chats * turns / (time.perf_counter() - start)
+            print(f"  {chats:>5}  {sequential:>8.1f} turn/s  {concurrent:>8.1f} turn/s")
+
+        await voice.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
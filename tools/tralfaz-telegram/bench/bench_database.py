@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: pooled per-thread connections vs. open-per-call.
+
+Runs the same mix a text message causes (store user message, read
+history, store reply) plus a schedule lookup, first with a fresh
+sqlite3.connect() per call as database.py used to, then through the
+pooled connections in database.py.
+
+    python bench/bench_database.py [iterations]
+"""
+
+import sqlite3
+import sys
+import time
+
+import _setup  # noqa: F401
+
+import database
+from config import MAX_HISTORY_MESSAGES
+
+CHAT_ID = 42
+
+
+def _legacy_store_message(path, chat_id, role, content):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
+        (chat_id, role, content),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _legacy_get_history(path, chat_id):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        """
+        SELECT role, content FROM (
+            SELECT role, content, id FROM messages
+            WHERE chat_id = ? ORDER BY id DESC LIMIT ?
+        ) sub ORDER BY id ASC
+        """,
+        (chat_id, MAX_HISTORY_MESSAGES),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def _legacy_list_appointments(path, chat_id):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        """
+        SELECT id, title, datetime, reminder_minutes_before, google_event_id
+        FROM appointments
+        WHERE chat_id = ? AND datetime >= datetime('now', 'localtime')
+        ORDER BY datetime ASC
+        """,
+        (chat_id,),
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def run_legacy(path, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        _legacy_store_message(path, CHAT_ID, "user", f"message {i}")
+        _legacy_get_history(path, CHAT_ID)
+        _legacy_store_message(path, CHAT_ID, "assistant", f"reply {i}")
+        _legacy_list_appointments(path, CHAT_ID)
+    return time.perf_counter() - start
+
+
+def run_pooled(iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        database.store_message(CHAT_ID, "user", f"message {i}")
+        database.get_history(CHAT_ID)
+        database.store_message(CHAT_ID, "assistant", f"reply {i}")
+        database.list_appointments(CHAT_ID)
+    return time.perf_counter() - start
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    ops = iterations * 4
+
+    # The legacy pattern gets a rollback-journal DB, as before this change.
+    legacy_path = _setup.temp_db_path("legacy.db")
+    database.DB_PATH = legacy_path
+    database.init_db()
+    database.close_connections()
+    conn = sqlite3.connect(legacy_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    legacy = run_legacy(legacy_path, iterations)
+
+    _setup.use_temp_db("pooled.db")
+    pooled = run_pooled(iterations)
+    database.close_connections()
+
+    print(f"{ops} operations ({iterations} simulated text turns)")
+    print(f"  open-per-call: {ops / legacy:10.0f} ops/sec  ({legacy * 1000 / ops:.3f} ms/op)")
+    print(f"  pooled:        {ops / pooled:10.0f} ops/sec  ({pooled * 1000 / ops:.3f} ms/op)")
+    print(f"  speedup:       {legacy / pooled:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""End-to-end turn latency through the real handlers, fully offline.
+
+The bot's real Telegram Bot (built the way bot.py builds it), Anthropic
+client and OpenAI calls are pointed at local fake servers with injected
+latency. Each scenario sends turns one at a time through
+handlers.handle_text / handle_voice, and every call that reaches a fake
+is timestamped, so a turn splits into stages:
+
+    whisper      transcription response (voice turns)
+    claude       first Claude response
+    first_text   first reply text visible in the chat
+    last_text    final text send or edit
+    first_voice  first voice note sent
+    total        handler returned
+
+p50/p95/p99 per stage are printed. --save-baseline stores them in
+bench/baselines/e2e.json; later runs with the same settings compare
+against it and exit non-zero if any p95 regressed.
+
+    python bench/bench_e2e.py [--turns N] [--telegram-ms 40] [--claude-ms 400] ...
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+import anthropic
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+import _setup
+from _stubs import FakeAnthropic, FakeTelegram, StubServer, openai_speech_route
+
+import claude_client
+import handlers
+import summaries
+import tts_cache
+import voice
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "e2e.json")
+STAGES = ("whisper", "claude", "first_text", "last_text", "first_voice", "total")
+# A p95 counts as regressed when it is this much slower than the baseline.
+REGRESSION_RATIO = 1.2
+REGRESSION_FLOOR_MS = 5.0
+
+SCENARIOS = {
+    # name: (kind, text or transcript, tool for the fake Claude)
+    "text": ("text", "Tell me something cheerful about Tuesdays.", None),
+    "tool": ("text", "Book the dentist for Thursday at 3pm.",
+             ("save_appointment", {"title": "Dentist", "datetime": "2030-01-03T15:00:00"})),
+    "intent": ("text", "What's on tomorrow?", None),
+    "voice": ("voice", "Tell me something cheerful about Tuesdays.", None),
+}
+
+
+def _recorded(name, route, events):
+    @functools.wraps(route)
+    def wrapper(method, path, headers, body):
+        events.append((time.perf_counter(), name, path))
+        return route(method, path, headers, body)
+
+    return wrapper
+
+
+def _update(bot, update_id: int, chat_id: int, kind: str, text: str) -> Update:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Sir"},
+    }
+    if kind == "voice":
+        message["voice"] = {"file_id": f"note-{update_id}", "file_unique_id": f"note-{update_id}", "duration": 2}
+    else:
+        message["text"] = text
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+def _stages(start: float, end: float, telegram_events, api_events) -> dict:
+    telegram = [event for event in telegram_events if start <= event[0] <= end]
+    api = [event for event in api_events if start <= event[0] <= end]
+
+    def first(times):
+        return (min(times) - start) * 1000 if times else None
+
+    stages = {
+        "whisper": first([t for t, name, path in api if name == "openai" and path.endswith("/transcriptions")]),
+        "claude": first([t for t, name, _ in api if name == "claude"]),
+        "first_text": first([
+            t for t, method, _, text in telegram
+            if method == "sendMessage" and not (text or "").startswith("[I heard")
+        ]),
+        "last_text": None,
+        "first_voice": first([t for t, method, _, _ in telegram if method == "sendVoice"]),
+        "total": (end - start) * 1000,
+    }
+    text_times = [
+        t for t, method, _, text in telegram
+        if method in ("sendMessage", "editMessageText") and not (text or "").startswith("[I heard")
+    ]
+    if text_times:
+        stages["last_text"] = (max(text_times) - start) * 1000
+    return {stage: value for stage, value in stages.items() if value is not None}
+
+
+async def _run(args) -> dict:
+    _setup.use_temp_db()
+    tts_cache.TTS_CACHE_DIR = tempfile.mkdtemp(prefix="tralfaz-bench-tts-")
+
+    async def local_summarizer(previous, messages):
+        # Background compaction would otherwise add Claude calls to later turns.
+        return (previous or "") + f" {len(messages)} more messages."
+
+    summaries.set_summarizer(local_summarizer)
+
+    api_events = []
+    telegram = FakeTelegram()
+    fake_claude = FakeAnthropic(
+        reply=lambda n: f"Very good, Sir. Reply number {n}. Tuesdays are the Thursdays of the early week.",
+        token_delay=args.token_ms / 1000,
+    )
+    transcript = {"value": ""}
+
+    def speech_route(method, path, headers, body):
+        return openai_speech_route(method, path, headers, body, transcript=transcript["value"])
+
+    telegram_server = StubServer(telegram.route, latency=args.telegram_ms / 1000)
+    claude_server = StubServer(_recorded("claude", fake_claude.route, api_events), latency=args.claude_ms / 1000)
+    whisper_server = StubServer(_recorded("openai", speech_route, api_events), latency=args.whisper_ms / 1000)
+    tts_server = StubServer(_recorded("openai", speech_route, api_events), latency=args.tts_ms / 1000)
+
+    results = {}
+    with telegram_server, claude_server, whisper_server, tts_server:
+        claude_client._client = anthropic.AsyncAnthropic(api_key="bench", base_url=claude_server.url)
+        voice.WHISPER_URL = f"{whisper_server.url}/v1/audio/transcriptions"
+        voice.TTS_URL = f"{tts_server.url}/v1/audio/speech"
+        app = (
+            ApplicationBuilder()
+            .token("123456:bench")
+            .base_url(f"{telegram_server.url}/bot")
+            .base_file_url(f"{telegram_server.url}/file/bot")
+            .build()
+        )
+        bot = app.bot
+        await bot.initialize()
+
+        update_id = 0
+        for chat_id, (name, (kind, text, tool)) in enumerate(SCENARIOS.items(), start=1):
+            if args.scenarios and name not in args.scenarios:
+                continue
+            fake_claude.tool = tool
+            transcript["value"] = text
+            samples = {stage: [] for stage in STAGES}
+            for turn in range(args.warmup + args.turns):
+                update_id += 1
+                update = _update(bot, update_id, chat_id, kind, text)
+                start = time.perf_counter()
+                if kind == "voice":
+                    await handlers.handle_voice(update, None)
+                else:
+                    await handlers.handle_text(update, None)
+                end = time.perf_counter()
+                if turn < args.warmup:
+                    continue
+                for stage, value in _stages(start, end, telegram.events, api_events).items():
+                    samples[stage].append(value)
+            results[name] = {
+                stage: {f"p{pct}": _setup.percentile(values, pct) for pct in (50, 95, 99)}
+                for stage, values in samples.items() if values
+            }
+
+        await bot.shutdown()
+        await voice.close()
+    return results
+
+
+def _config(args) -> dict:
+    return {
+        "turns": args.turns,
+        "telegram_ms": args.telegram_ms,
+        "claude_ms": args.claude_ms,
+        "token_ms": args.token_ms,
+        "whisper_ms": args.whisper_ms,
+        "tts_ms": args.tts_ms,
+    }
+
+
+def _report(results: dict, baseline: dict) -> list[str]:
+    regressions = []
+    for scenario, stages in results.items():
+        print(f"\n{scenario}")
+        print(f"  {'stage':<12} {'p50':>9} {'p95':>9} {'p99':>9}   {'baseline p95':>12}")
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            row = stages[stage]
+            line = f"  {stage:<12} {row['p50']:9.1f} {row['p95']:9.1f} {row['p99']:9.1f}"
+            base = baseline.get(scenario, {}).get(stage)
+            if base:
+                line += f"   {base['p95']:12.1f}"
+                if row["p95"] > base["p95"] * REGRESSION_RATIO + REGRESSION_FLOOR_MS:
+                    line += "  REGRESSED"
+                    regressions.append(f"{scenario}/{stage}")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--telegram-ms", type=float, default=40)
+    parser.add_argument("--claude-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=10, help="delay between streamed words")
+    parser.add_argument("--whisper-ms", type=float, default=300)
+    parser.add_argument("--tts-ms", type=float, default=250)
+    parser.add_argument("--scenario", dest="scenarios", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    config = _config(args)
+    print("Settings: " + ", ".join(f"{key}={value}" for key, value in config.items()) + " (times in ms)")
+    results = asyncio.run(_run(args))
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH) as f:
+            stored = json.load(f)
+        if stored.get("config") == config:
+            baseline = stored["results"]
+        else:
+            print("Stored baseline used different settings; not comparing.")
+
+    regressions = _report(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+    elif regressions:
+        print(f"\nRegressed p95: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark: prompt size over a replayed long conversation.
+
+Replays a synthetic chat turn by turn through the message store and
+compares what each request would carry: the plain last-N history versus
+the rolling summary plus recent messages. The summarizer is a local stand-in
+that keeps a bounded digest (no API calls), and compaction is awaited after
+each turn so the numbers reflect the steady state.
+
+    python bench/bench_history_compaction.py [turns]
+"""
+
+import asyncio
+import random
+import sys
+
+import _setup
+
+import database
+import summaries
+from config import HISTORY_TOKEN_BUDGET, HISTORY_COMPACT_TARGET, MAX_HISTORY_MESSAGES
+
+CHAT_ID = 1
+SUMMARY_CHARS = 1200
+
+_TOPICS = [
+    "the dentist on Thursday", "Mother's birthday dinner", "the quarterly board meeting",
+    "a haircut before the gala", "the car's annual service", "lunch with Henderson",
+    "the flight to Edinburgh", "tickets for the symphony", "the gardener's schedule",
+]
+
+
+async def fake_summarizer(previous, messages) -> str:
+    digest = " ".join(message["content"][:60] for message in messages)
+    return ((previous or "") + " " + digest)[-SUMMARY_CHARS:]
+
+
+def _turn(rng: random.Random, i: int) -> tuple[str, str]:
+    topic = rng.choice(_TOPICS)
+    user = f"Turn {i}: please sort out {topic}. " + "Some further detail about what I need done there. " * rng.randint(1, 8)
+    reply = f"Very good, Sir. Regarding {topic}, it is in hand. " + "A further butlerly remark on the arrangements. " * rng.randint(4, 20)
+    return user, reply
+
+
+async def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    _setup.use_temp_db()
+    summaries.set_summarizer(fake_summarizer)
+    rng = random.Random(3)
+
+    baseline, compacted = [], []
+    compactions = 0
+    for i in range(turns):
+        user, reply = _turn(rng, i)
+        database.store_message(CHAT_ID, "user", user)
+
+        plain = database.get_connection().execute(
+            "SELECT content FROM (SELECT content, id FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT ?)",
+            (CHAT_ID, MAX_HISTORY_MESSAGES),
+        ).fetchall()
+        baseline.append(sum(summaries.estimate_tokens(row[0]) for row in plain))
+
+        summary, history = await summaries.load_context(CHAT_ID)
+        compacted.append(
+            summaries.estimate_message_tokens(history) + (summaries.estimate_tokens(summary) if summary else 0)
+        )
+
+        database.store_message(CHAT_ID, "assistant", reply)
+        compactions += await summaries.compact(CHAT_ID)
+
+    print(
+        f"{turns} turns replayed, HISTORY_TOKEN_BUDGET={HISTORY_TOKEN_BUDGET}, "
+        f"HISTORY_COMPACT_TARGET={HISTORY_COMPACT_TARGET}, {compactions} compactions"
+    )
+    for label, sizes in (("last-N history", baseline), ("summary + recent", compacted)):
+        tail = sizes[len(sizes) // 2:]
+        print(
+            f"  {label:<17} avg {sum(sizes) / len(sizes):7.0f} tokens"
+            f"   second-half avg {sum(tail) / len(tail):7.0f}   max {max(sizes):6d}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark: search_history latency over millions of messages.
+
+Fills a temp DB with synthetic messages across many chats (one of them
+much busier than the rest) with the FTS index dropped, times the bulk
+'rebuild' migration, then times database.search_messages for a few
+queries of different selectivity.
+
+    python bench/bench_history_search.py [messages] [runs]
+"""
+
+import random
+import sys
+import time
+
+import _setup
+
+import database
+
+BUSY_CHAT = 42
+
+_WORDS = (
+    "dinner lunch meeting dentist flight train hotel gala symphony garden roses car "
+    "service tailor suit birthday mother board quarterly report invoice wine cellar "
+    "tickets theatre doctor appointment tomorrow tuesday friday morning evening "
+    "please thank very good sir indeed certainly arrange remind cancel move"
+).split()
+
+QUERIES = ["dentist", "Henderson orchids", "quarterly board report", "please arrange dinner tomorrow evening"]
+
+
+def _fill(total: int):
+    rng = random.Random(11)
+    conn = database.get_connection()
+    with conn:
+        conn.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+        conn.execute("DROP TABLE IF EXISTS messages_fts")
+    batch = []
+    for i in range(total):
+        chat_id = BUSY_CHAT if rng.random() < 0.2 else rng.randint(1000, 20000)
+        words = rng.choices(_WORDS, k=rng.randint(6, 40))
+        if i % 50000 == 0:
+            words += ["Henderson", "orchids"]
+        batch.append((chat_id, "user" if i % 2 == 0 else "assistant", " ".join(words)))
+        if len(batch) == 100000:
+            _insert(conn, batch)
+            batch = []
+    _insert(conn, batch)
+
+
+def _insert(conn, batch):
+    with conn:
+        conn.executemany("INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)", batch)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    _setup.use_temp_db()
+
+    start = time.perf_counter()
+    _fill(total)
+    print(f"Inserted {total:,} messages in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    database._migrate_messages_fts()
+    print(f"FTS rebuild migration: {time.perf_counter() - start:.1f}s")
+
+    inserts = 1000
+    start = time.perf_counter()
+    for i in range(inserts):
+        database.store_message(BUSY_CHAT, "user", f"live insert {i} with trigger upkeep")
+    print(f"Insert with FTS trigger: {(time.perf_counter() - start) * 1000 / inserts:.3f} ms per message")
+
+    for query in QUERIES:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results = database.search_messages(BUSY_CHAT, query)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(
+            f"  {query!r:<42} p50 {_setup.percentile(samples, 50):8.2f} ms"
+            f"   p99 {_setup.percentile(samples, 99):8.2f} ms   ({len(results)} results)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Benchmark: a burst of reminders that all fire at the same moment.
+
+Creates N appointments spread over several chats whose reminders fire
+together, runs the real reminders loop against a fake bot with per-send
+latency and a TTS stub with per-request latency, and reports how late the
+reminder text and voice note went out relative to the fire time.
+
+Compare the fan-out against the old one-at-a-time behaviour with
+--concurrency 1 --no-prefetch.
+
+    python bench/bench_reminder_fanout.py [--reminders 40] [--chats 10] [--telegram-ms 60] [--tts-ms 400]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import _setup
+from _fake_telegram import FakeBot
+from _stubs import StubServer, openai_speech_route
+
+import database
+import ratelimit
+import reminders
+import tts_cache
+import voice
+
+
+class SlowBot(FakeBot):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        return await super().send_message(chat_id, text, **kwargs)
+
+    async def send_voice(self, chat_id, voice, **kwargs):
+        await asyncio.sleep(self.latency)
+        return await super().send_voice(chat_id, voice, **kwargs)
+
+
+def _create(count: int, chats: int, fire_at: float):
+    # Reminder one minute ahead of start, so remind_at lands on fire_at.
+    start = database.local_now() + timedelta(seconds=fire_at - time.time() + 60)
+    for i in range(count):
+        database.save_appointment(1000 + i % chats, f"Engagement {i}", start.isoformat(timespec="seconds"), 1)
+
+
+async def _run(args) -> tuple[list[float], list[float]]:
+    _setup.use_temp_db()
+    tts_cache.TTS_CACHE_DIR = tempfile.mkdtemp(prefix="tralfaz-bench-tts-")
+    reminders.REMINDER_MAX_CONCURRENCY = args.concurrency
+    reminders.REMINDER_PREFETCH_SECONDS = 0 if args.no_prefetch else args.lead - 0.5
+
+    # Whole seconds, since appointment times are stored to the second.
+    fire_at = float(int(time.time()) + args.lead)
+    _create(args.reminders, args.chats, fire_at)
+
+    bot = SlowBot(args.telegram_ms / 1000)
+    with StubServer(openai_speech_route, latency=args.tts_ms / 1000) as server:
+        voice.TTS_URL = f"{server.url}/v1/audio/speech"
+        await reminders.start_reminders(SimpleNamespace(bot=bot))
+        deadline = fire_at + 120
+        while time.time() < deadline and sum(1 for _, kind, _, _ in bot.sent if kind == "voice") < args.reminders:
+            await asyncio.sleep(0.05)
+        await voice.close()
+
+    # FakeBot stamps sends with perf_counter; map the fire time onto that clock.
+    fire_perf = time.perf_counter() - (time.time() - fire_at)
+    text = [(t - fire_perf) * 1000 for t, kind, _, _ in bot.sent if kind == "text"]
+    voices = [(t - fire_perf) * 1000 for t, kind, _, _ in bot.sent if kind == "voice"]
+    return text, voices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reminders", type=int, default=40)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--telegram-ms", type=float, default=60)
+    parser.add_argument("--tts-ms", type=float, default=400)
+    parser.add_argument("--concurrency", type=int, default=reminders.REMINDER_MAX_CONCURRENCY)
+    parser.add_argument("--no-prefetch", action="store_true")
+    parser.add_argument("--lead", type=int, default=3, help="seconds until the reminders fire")
+    args = parser.parse_args()
+
+    print(
+        f"{args.reminders} reminders over {args.chats} chats, concurrency={args.concurrency}, "
+        f"prefetch={'off' if args.no_prefetch else 'on'}, global limit {ratelimit.TELEGRAM_GLOBAL_RATE}/s, "
+        f"per chat {ratelimit.TELEGRAM_CHAT_RATE}/s"
+    )
+    text, voices = asyncio.run(_run(args))
+    print(f"Delivered {len(text)} text / {len(voices)} voice")
+    print(f"{'lateness (ms)':<16}{'p50':>9}{'p95':>9}{'max':>9}")
+    for name, samples in (("text", text), ("voice", voices)):
+        if samples:
+            print(
+                f"{name:<16}{_setup.percentile(samples, 50):9.0f}"
+                f"{_setup.percentile(samples, 95):9.0f}{max(samples):9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Benchmark: due-reminder lookup on a large appointments table.
+
+Fills a temp DB with synthetic appointments spread over two years around
+today (past ones already reminded), then times the old expression-based
+query against database.get_due_reminders, which range-scans the partial
+index on remind_at.
+
+    python bench/bench_reminder_query.py [rows] [runs]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import _setup
+
+import database
+
+LEGACY_QUERY = """
+    SELECT id, chat_id, title, datetime, reminder_minutes_before
+    FROM appointments
+    WHERE reminded = 0
+      AND datetime >= datetime('now', 'localtime')
+      AND datetime <= datetime('now', 'localtime', '+' || reminder_minutes_before || ' minutes')
+"""
+
+
+def _fill(rows: int):
+    rng = random.Random(7)
+    now = datetime.now().replace(microsecond=0)
+    conn = database.get_connection()
+    batch = []
+    for i in range(rows):
+        start = now + timedelta(minutes=rng.randint(-365 * 24 * 60, 365 * 24 * 60))
+        minutes = rng.choice((10, 15, 30, 60))
+        dt = start.isoformat()
+        batch.append((
+            rng.randint(1, 5000), f"Appointment {i}", dt, minutes,
+            int(start < now), *database.appointment_epochs(dt, minutes),
+        ))
+        if len(batch) == 50000:
+            _insert(conn, batch)
+            batch = []
+    _insert(conn, batch)
+    conn.execute("ANALYZE")
+
+
+def _insert(conn, batch):
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO appointments
+                (chat_id, title, datetime, reminder_minutes_before, reminded, start_epoch, remind_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch,
+        )
+
+
+def _time(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, len(result)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    _setup.use_temp_db()
+
+    start = time.perf_counter()
+    _fill(rows)
+    print(f"Inserted {rows:,} appointments in {time.perf_counter() - start:.1f}s")
+
+    conn = database.get_connection()
+    legacy, legacy_hits = _time(lambda: conn.execute(LEGACY_QUERY).fetchall(), runs)
+    indexed, indexed_hits = _time(database.get_due_reminders, runs)
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM appointments WHERE reminded = 0 AND remind_at <= ? AND start_epoch >= ?",
+        (0, 0),
+    ).fetchall()
+    print(f"  plan: {' / '.join(row[3] for row in plan)}")
+    for label, samples, hits in (("expression scan", legacy, legacy_hits), ("remind_at index", indexed, indexed_hits)):
+        print(
+            f"  {label:<16} p50 {_setup.percentile(samples, 50):9.3f} ms"
+            f"   p99 {_setup.percentile(samples, 99):9.3f} ms   ({hits} due)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark: per-call httpx clients vs. the shared pooled client in voice.py.
+
+Serves fake TTS responses from a local HTTPS stub, then times
+synthesize_speech-style calls with a brand-new AsyncClient per call (the
+old behaviour, a TCP + TLS handshake every time) and with voice.py's
+shared keep-alive client.
+
+    python bench/bench_voice_http.py [calls] [server_latency_ms]
+"""
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+import _setup
+from _stubs import FAKE_OPUS, StubServer
+
+import voice
+
+def _route(method, path, headers, body):
+    return 200, {"Content-Type": "audio/ogg"}, FAKE_OPUS
+
+
+async def _per_call(url, ssl_context):
+    async with httpx.AsyncClient(timeout=60.0, verify=ssl_context) as client:
+        response = await client.post(
+            url,
+            headers={"Authorization": "Bearer bench"},
+            json={"model": "tts-1", "input": "Very good, Sir.", "voice": "nova", "response_format": "opus"},
+        )
+        response.raise_for_status()
+        return response.content
+
+
+async def _time_calls(calls, fn):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label, samples):
+    print(
+        f"  {label:<16} p50 {_setup.percentile(samples, 50):7.2f} ms"
+        f"   p99 {_setup.percentile(samples, 99):7.2f} ms"
+    )
+
+
+async def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+
+    with StubServer(_route, latency=latency, tls=True) as server:
+        ssl_context = server.client_ssl_context()
+        voice.TTS_URL = f"{server.url}/v1/audio/speech"
+
+        before = await _time_calls(calls, lambda: _per_call(voice.TTS_URL, ssl_context))
+
+        voice._client = voice._new_client(verify=ssl_context)
+        after = await _time_calls(calls, lambda: voice.synthesize_speech("Very good, Sir."))
+        await voice.close()
+
+    print(f"{calls} TTS calls against a local HTTPS stub ({latency * 1000:.0f} ms injected latency)")
+    _report("client per call", before)
+    _report("shared client", after)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Benchmark: update intake through a webhook vs. long polling.
+
+Runs a real python-telegram-bot Application (concurrent_updates as in
+bot.py) against the fake Bot API and feeds it N synthetic text updates
+spread over several chats, arriving at a fixed rate:
+
+    polling   updates are queued on the fake server and fetched by the
+              Updater's getUpdates long poll
+    webhook   updates are POSTed to the Updater's webhook server with the
+              secret token the way Telegram delivers them: up to
+              --connections requests in flight, but a chat's next update
+              only after the previous one was acknowledged
+
+Every request to the fake API and every webhook POST pays --rtt-ms of
+injected network latency. The handler is wrapped in the same per-chat lock
+as the real handlers and sleeps --work-ms. Reports throughput, the delay
+from an update becoming available to its handler starting, and any update
+handled out of order within its chat. Also checks that a POST with a wrong
+secret is rejected.
+
+The feeder, the fake API and the bot share this machine's CPUs; on a small
+box, rates much above a few hundred per second measure the HTTP client
+rather than the bot.
+
+    python bench/bench_webhook.py [--updates 2000] [--chats 50] [--rate 200] [--rtt-ms 50]
+"""
+
+import argparse
+import asyncio
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import httpx
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+import _setup
+from _stubs import FakeTelegram, StubServer
+
+import handlers
+from config import CONCURRENT_UPDATES
+
+WEBHOOK_PATH = "telegram"
+
+
+def _update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Sir"},
+            "text": f"message {update_id}",
+        },
+    }
+
+
+async def _feed(mode: str, updates: list[dict], url: str, secret: str, args,
+                telegram: Optional[FakeTelegram] = None) -> dict[int, float]:
+    """Make updates available at a fixed rate: queued for getUpdates, or POSTed to the webhook.
+
+    Returns the perf_counter time at which each update became available.
+    """
+    available: dict[int, float] = {}
+    connections = asyncio.Semaphore(args.connections)
+    chat_queues: dict[int, asyncio.Lock] = {}
+
+    async def post(client: httpx.AsyncClient, update: dict):
+        available[update["update_id"]] = time.perf_counter()
+        chat_id = update["message"]["chat"]["id"]
+        async with chat_queues.setdefault(chat_id, asyncio.Lock()), connections:
+            await asyncio.sleep(args.rtt_ms / 1000)
+            response = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.connections)) as client:
+        posts = []
+        begin = time.perf_counter()
+        for i, update in enumerate(updates):
+            delay = begin + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if mode == "webhook":
+                posts.append(asyncio.create_task(post(client, update)))
+            else:
+                available[update["update_id"]] = time.perf_counter()
+                telegram.push_update(update)
+        await asyncio.gather(*posts)
+    return available
+
+
+def _feed_in_process(*args) -> dict[int, float]:
+    return asyncio.run(_feed(*args))
+
+
+async def _run(mode: str, args) -> dict:
+    telegram = FakeTelegram()
+    started: dict[int, float] = {}
+    last_seen: dict[int, int] = {}
+    out_of_order = 0
+    done = asyncio.Event()
+
+    @handlers._serialized_per_chat
+    async def handle(update, context):
+        nonlocal out_of_order
+        started[update.update_id] = time.perf_counter()
+        chat_id = update.effective_chat.id
+        if last_seen.get(chat_id, 0) > update.update_id:
+            out_of_order += 1
+        last_seen[chat_id] = max(last_seen.get(chat_id, 0), update.update_id)
+        await asyncio.sleep(args.work_ms / 1000)
+        if len(started) == args.updates:
+            done.set()
+
+    updates = [_update(i + 1, 1000 + i % args.chats) for i in range(args.updates)]
+    secret = secrets.token_urlsafe(32)
+    result = {}
+
+    with StubServer(telegram.route, latency=args.rtt_ms / 1000) as server:
+        app = (
+            ApplicationBuilder()
+            .token("123456:bench")
+            .base_url(f"{server.url}/bot")
+            .base_file_url(f"{server.url}/file/bot")
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .build()
+        )
+        app.add_handler(MessageHandler(filters.TEXT, handle))
+        await app.initialize()
+        if mode == "webhook":
+            await app.updater.start_webhook(
+                listen="127.0.0.1",
+                port=args.port,
+                url_path=WEBHOOK_PATH,
+                webhook_url=f"https://bench.invalid/{WEBHOOK_PATH}",
+                secret_token=secret,
+                max_connections=args.connections,
+            )
+        else:
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+        await app.start()
+
+        url = f"http://127.0.0.1:{args.port}/{WEBHOOK_PATH}"
+        if mode == "webhook":
+            async with httpx.AsyncClient() as client:
+                rejected = await client.post(
+                    url, json=_update(0, 1), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+                )
+            result["wrong_secret_status"] = rejected.status_code
+
+        # The feeder plays Telegram. Webhook posts come from a separate
+        # process, so the two sides don't contend for one GIL; perf_counter
+        # is system-wide, so its timestamps are comparable. Polling needs the
+        # in-process fake server and feeds from a thread.
+        begin = time.perf_counter()
+        if mode == "webhook":
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                available = await asyncio.get_running_loop().run_in_executor(
+                    pool, _feed_in_process, mode, updates, url, secret, args
+                )
+        else:
+            available = await asyncio.to_thread(asyncio.run, _feed(mode, updates, url, secret, args, telegram))
+        await asyncio.wait_for(done.wait(), timeout=600)
+        elapsed = time.perf_counter() - begin
+
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+
+    delays = [(started[update_id] - available[update_id]) * 1000 for update_id in started]
+    result.update(
+        throughput=len(started) / elapsed,
+        p50=_setup.percentile(delays, 50),
+        p95=_setup.percentile(delays, 95),
+        p99=_setup.percentile(delays, 99),
+        out_of_order=out_of_order,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=200, help="updates arriving per second")
+    parser.add_argument("--rtt-ms", type=float, default=50)
+    parser.add_argument("--work-ms", type=float, default=20, help="handler time per update")
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--port", type=int, default=18443)
+    args = parser.parse_args()
+
+    print(
+        f"{args.updates} updates over {args.chats} chats at {args.rate:.0f}/s, "
+        f"rtt {args.rtt_ms:.0f} ms, {args.work_ms:.0f} ms per handler, concurrent_updates={CONCURRENT_UPDATES}"
+    )
+    print(f"{'mode':<10}{'updates/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'out of order':>14}")
+    for mode in ("polling", "webhook"):
+        row = asyncio.run(_run(mode, args))
+        print(
+            f"{mode:<10}{row['throughput']:11.0f}{row['p50']:9.1f}{row['p95']:9.1f}"
+            f"{row['p99']:9.1f}{row['out_of_order']:14d}"
+        )
+        if "wrong_secret_status" in row:
+            print(f"  POST with a wrong secret token: HTTP {row['wrong_secret_status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,35 @@
 import logging
+from urllib.parse import urlparse
 
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
 
+import async_database
+import calendar_sync
 import database
-from config import TELEGRAM_BOT_TOKEN
-from handlers import start_command, clear_command, schedule_command, handle_text, handle_voice
+import google_calendar
+import metrics
+import profiling
+import retention
+import voice
+from config import (
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_WEBHOOK_URL,
+    TELEGRAM_WEBHOOK_SECRET,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+    CONCURRENT_UPDATES,
+)
+from handlers import (
+    start_command,
+    clear_command,
+    schedule_command,
+    stats_command,
+    profile_command,
+    briefing_command,
+    handle_text,
+    handle_voice,
+)
 from briefings import start_briefings
 from reminders import start_reminders
 
@@ -18,21 +43,58 @@ logger = logging.getLogger(__name__)
 async def _post_init(app):
     await start_reminders(app)
     await start_briefings(app)
+    await google_calendar.start_token_refresh(app)
+    await calendar_sync.start_calendar_sync(app)
+    await retention.start_retention(app)
+    await metrics.start_metrics_server(app)
+    await profiling.start_lag_monitor(app)
+
+
+async def _post_shutdown(app):
+    await metrics.stop_metrics_server()
+    await voice.close()
+    async_database.shutdown()
+    database.close_connections()
 
 
 def main():
     database.init_db()
 
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).post_init(_post_init).build()
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("clear", clear_command))
     app.add_handler(CommandHandler("schedule", schedule_command))
+    app.add_handler(CommandHandler("briefing", briefing_command))
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("profile", profile_command))
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
     logger.info("Tralfaz is ready for duty, Sir.")
-    app.run_polling()
+    if TELEGRAM_WEBHOOK_URL:
+        # Telegram sends a chat's next update only after the previous one is
+        # acknowledged, and PTB acknowledges as soon as an update is queued.
+        # Processing runs concurrently behind that; the handlers' per-chat
+        # locks keep each chat in order.
+        logger.info("Serving webhook on %s:%s for %s", WEBHOOK_LISTEN, WEBHOOK_PORT, TELEGRAM_WEBHOOK_URL)
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=urlparse(TELEGRAM_WEBHOOK_URL).path.lstrip("/"),
+            webhook_url=TELEGRAM_WEBHOOK_URL,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
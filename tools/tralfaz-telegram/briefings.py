@@ -1,21 +1,56 @@
 import asyncio
+import hashlib
+import heapq
+import json
 import logging
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
 
+import async_database
+import background
 import claude_client
-import database
+import ratelimit
+import speech_pipeline
 from config import (
-    OWNER_CHAT_ID,
-    MORNING_BRIEFING_HOUR,
-    EVENING_BRIEFING_HOUR,
-    REMINDER_CHECK_INTERVAL,
+    APPOINTMENT_TIMEZONE,
+    BRIEFING_CATCHUP_SECONDS,
+    BRIEFING_MAX_CONCURRENCY,
+    BRIEFING_PRECOMPUTE_SECONDS,
     get_briefing_prompt,
 )
-from voice import synthesize_speech
 
 logger = logging.getLogger(__name__)
 
-_last_sent = {"morning": None, "evening": None}
+BRIEFING_TYPES = ("morning", "evening")
+
+# Per-chat schedules (rows of briefing_schedules), loaded once at startup and
+# kept in step by set_schedule. The heaps hold (fire_time, chat_id, type) and
+# (precompute_time, fire_time, chat_id, type); _next_fire has the current
+# fire time per (chat_id, type) and heap entries that don't match it are
+# stale and skipped, as in reminders.py.
+_schedules: dict[int, dict] = {}
+_heap: list[tuple[float, int, str]] = []
+_precompute_heap: list[tuple[float, float, int, str]] = []
+_next_fire: dict[tuple[int, str], float] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+_tasks: set[asyncio.Task] = set()
+
+# Rendered briefing text per chat, keyed by (briefing_type, delivery day).
+# Each entry remembers the hash of the appointment set it was rendered from,
+# so a changed schedule is never served from a stale render.
+_cache: dict[int, dict[tuple[str, date], tuple[str, str]]] = {}
+_inflight: dict[tuple, asyncio.Task] = {}
+# Renders whose audio is already in the TTS cache, same keys as _cache.
+_prefetched: dict[int, dict[tuple[str, date], str]] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _timezone(chat_id: int) -> ZoneInfo:
+    schedule = _schedules.get(chat_id)
+    return ZoneInfo(schedule["timezone"] if schedule else APPOINTMENT_TIMEZONE)
 
 
 def _format_appointments(appointments: list[dict]) -> str:
@@ -23,61 +58,229 @@ def _format_appointments(appointments: list[dict]) -> str:
         return "None scheduled."
     lines = []
     for appt in appointments:
+        # Stored in APPOINTMENT_TIMEZONE, as /schedule and reminders show them.
         dt = datetime.fromisoformat(appt["datetime"])
         lines.append(f"- {appt['title']} at {dt.strftime('%I:%M %p')}")
     return "\n".join(lines)
 
 
-def _generate_briefing(briefing_type: str, chat_id: int) -> str:
-    if briefing_type == "morning":
-        appointments = database.get_todays_appointments(chat_id)
-    else:
-        appointments = database.get_tomorrows_appointments(chat_id)
+def _appointments_hash(appointments: list[dict]) -> str:
+    payload = json.dumps([(appt["id"], appt["title"], appt["datetime"]) for appt in appointments])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
-    appointments_text = _format_appointments(appointments)
-    system = get_briefing_prompt(briefing_type, appointments_text)
+async def _render(key: tuple[int, str, date], digest: str, appointments: list[dict]) -> str:
+    chat_id, briefing_type, day = key
+    system = get_briefing_prompt(briefing_type, _format_appointments(appointments), day)
     messages = [{"role": "user", "content": "Please give me my briefing."}]
-    return claude_client.get_response_with_system(system, messages)
+    text = await claude_client.get_response_with_system(system, messages)
+    _cache.setdefault(chat_id, {})[(briefing_type, day)] = (digest, text)
+    logger.info("Rendered %s briefing for chat %s on %s", briefing_type, chat_id, day)
+    return text
+
+
+async def _get_briefing(briefing_type: str, chat_id: int, day: date) -> tuple[tuple, str, str]:
+    # A morning briefing covers its own day, an evening briefing the next one.
+    # day is the chat's local date; appointments on that date are looked up
+    # in APPOINTMENT_TIMEZONE like every other appointment query.
+    appointments_day = day if briefing_type == "morning" else day + timedelta(days=1)
+    appointments = await async_database.get_appointments_on(chat_id, appointments_day)
+    digest = _appointments_hash(appointments)
+    key = (chat_id, briefing_type, day)
+
+    cached = _cache.get(chat_id, {}).get((briefing_type, day))
+    if cached is not None and cached[0] == digest:
+        return key, digest, cached[1]
+
+    task_key = (*key, digest)
+    task = _inflight.get(task_key)
+    if task is None:
+        task = asyncio.ensure_future(_render(key, digest, appointments))
+        _inflight[task_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(task_key, None))
+    return key, digest, await asyncio.shield(task)
+
+
+async def get_briefing(briefing_type: str, chat_id: int, day: Optional[date] = None) -> str:
+    """Return briefing text, re-rendering only if the day's appointments changed."""
+    day = day or datetime.now(_timezone(chat_id)).date()
+    _, _, text = await _get_briefing(briefing_type, chat_id, day)
+    return text
+
+
+# --- Scheduling ---
+
+
+def _next_fire_time(schedule: dict, briefing_type: str, now: float) -> Optional[float]:
+    """Epoch of the next briefing of this type, or None if it is off.
+
+    A briefing that is overdue by less than BRIEFING_CATCHUP_SECONDS and not
+    yet sent (e.g. the bot was down at the hour) is due immediately.
+    """
+    hour = schedule[f"{briefing_type}_hour"]
+    if hour is None:
+        return None
+    tz = ZoneInfo(schedule["timezone"])
+    day = datetime.fromtimestamp(now, tz).date()
+    last_sent = schedule[f"last_{briefing_type}"]
+    while True:
+        fire_time = datetime(day.year, day.month, day.day, hour, tzinfo=tz).timestamp()
+        if (last_sent is None or day.isoformat() > last_sent) and fire_time > now - BRIEFING_CATCHUP_SECONDS:
+            return fire_time
+        day += timedelta(days=1)
+
+
+def _schedule_chat(chat_id: int, now: float):
+    schedule = _schedules.get(chat_id)
+    tops = [heap[0][0] for heap in (_heap, _precompute_heap) if heap]
+    for briefing_type in BRIEFING_TYPES:
+        key = (chat_id, briefing_type)
+        fire_time = _next_fire_time(schedule, briefing_type, now) if schedule else None
+        if fire_time is None:
+            _next_fire.pop(key, None)
+            continue
+        if _next_fire.get(key) == fire_time:
+            continue
+        _next_fire[key] = fire_time
+        heapq.heappush(_heap, (fire_time, chat_id, briefing_type))
+        heapq.heappush(_precompute_heap, (fire_time - BRIEFING_PRECOMPUTE_SECONDS, fire_time, chat_id, briefing_type))
+        if _wakeup is not None and (not tops or fire_time - BRIEFING_PRECOMPUTE_SECONDS < min(tops)):
+            _wakeup.set()
+
+
+def _pop(heap: list, now: float) -> list[tuple[float, int, str]]:
+    due = []
+    while heap and heap[0][0] <= now:
+        *_, fire_time, chat_id, briefing_type = heapq.heappop(heap)
+        if _next_fire.get((chat_id, briefing_type)) == fire_time:
+            due.append((fire_time, chat_id, briefing_type))
+    return due
+
+
+async def _load():
+    rows = await async_database.get_briefing_schedules()
+    now = time.time()
+    for schedule in rows:
+        _schedules[schedule["chat_id"]] = schedule
+        _schedule_chat(schedule["chat_id"], now)
+    logger.info("Loaded %d briefing schedule(s)", len(rows))
 
 
-async def send_briefing(app, briefing_type: str, chat_id: int):
+async def set_schedule(chat_id: int, timezone: str, morning_hour: Optional[int], evening_hour: Optional[int]):
+    """Store a chat's briefing schedule and reschedule it. Hours of None switch a briefing off."""
+    await async_database.set_briefing_schedule(chat_id, timezone, morning_hour, evening_hour)
+    _schedules[chat_id] = await async_database.get_briefing_schedule(chat_id)
+    _schedule_chat(chat_id, time.time())
+
+
+def get_schedule(chat_id: int) -> Optional[dict]:
+    return _schedules.get(chat_id)
+
+
+def _delivery_day(chat_id: int, fire_time: float) -> date:
+    return datetime.fromtimestamp(fire_time, _timezone(chat_id)).date()
+
+
+async def precompute(chat_id: int, briefing_type: str, day: date):
+    """Render an upcoming briefing and warm its audio."""
+    _, digest, text = await _get_briefing(briefing_type, chat_id, day)
+    prefetched = _prefetched.setdefault(chat_id, {})
+    if prefetched.get((briefing_type, day)) != digest:
+        await speech_pipeline.prefetch(text)
+        prefetched[(briefing_type, day)] = digest
+
+
+def _invalidate(chat_id: int):
+    _cache.pop(chat_id, None)
+    # Re-render straight away if a briefing is coming up soon.
+    now = time.time()
+    for briefing_type in BRIEFING_TYPES:
+        fire_time = _next_fire.get((chat_id, briefing_type))
+        if fire_time is not None and fire_time - BRIEFING_PRECOMPUTE_SECONDS <= now:
+            heapq.heappush(_precompute_heap, (now, fire_time, chat_id, briefing_type))
+            if _wakeup is not None:
+                _wakeup.set()
+
+
+def invalidate(chat_id: int):
+    """Drop a chat's rendered briefings after its appointments change. Safe to call from any thread."""
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_invalidate, chat_id)
+
+
+async def send_briefing(app, briefing_type: str, chat_id: int, day: Optional[date] = None):
     try:
-        text = await asyncio.to_thread(_generate_briefing, briefing_type, chat_id)
+        text = await get_briefing(briefing_type, chat_id, day)
     except Exception:
         logger.exception("Failed to generate %s briefing", briefing_type)
         return
 
     try:
+        await ratelimit.acquire(chat_id)
         await app.bot.send_message(chat_id=chat_id, text=text)
     except Exception:
         logger.exception("Failed to send %s briefing message", briefing_type)
         return
 
     try:
-        audio_bytes = await synthesize_speech(text)
-        await app.bot.send_voice(chat_id=chat_id, voice=audio_bytes)
+        await speech_pipeline.speak(app.bot, chat_id, text, paced=True)
     except Exception:
         logger.exception("TTS failed for %s briefing", briefing_type)
 
 
+async def _deliver(app, chat_id: int, briefing_type: str, fire_time: float):
+    day = _delivery_day(chat_id, fire_time)
+    try:
+        # Claimed before sending: a crash mid-send loses one briefing rather
+        # than repeating it after the restart.
+        if await async_database.claim_briefing(chat_id, briefing_type, day):
+            async with _semaphore:
+                await send_briefing(app, briefing_type, chat_id, day)
+    finally:
+        # Whether it was claimed here, elsewhere or failed, day is done;
+        # otherwise catch-up would make the same briefing due again at once.
+        schedule = _schedules.get(chat_id)
+        if schedule is not None:
+            last_sent = schedule[f"last_{briefing_type}"]
+            schedule[f"last_{briefing_type}"] = max(last_sent or "", day.isoformat())
+        _schedule_chat(chat_id, max(time.time(), fire_time + 1))
+
+    for entries in (_cache.get(chat_id, {}), _prefetched.get(chat_id, {})):
+        for key in [key for key in entries if key[1] < day]:
+            del entries[key]
+
+
+async def _precompute(chat_id: int, briefing_type: str, fire_time: float):
+    async with _semaphore:
+        await precompute(chat_id, briefing_type, _delivery_day(chat_id, fire_time))
+
+
 async def briefing_loop(app):
     logger.info("Briefing background task started")
+    await _load()
     while True:
-        await asyncio.sleep(REMINDER_CHECK_INTERVAL)
+        _wakeup.clear()
+        now = time.time()
         try:
-            now = datetime.now()
-            today = now.strftime("%Y-%m-%d")
-
-            if now.hour == MORNING_BRIEFING_HOUR and _last_sent["morning"] != today:
-                _last_sent["morning"] = today
-                await send_briefing(app, "morning", OWNER_CHAT_ID)
-
-            if now.hour == EVENING_BRIEFING_HOUR and _last_sent["evening"] != today:
-                _last_sent["evening"] = today
-                await send_briefing(app, "evening", OWNER_CHAT_ID)
+            for fire_time, chat_id, briefing_type in _pop(_precompute_heap, now):
+                background.spawn(_tasks, _precompute(chat_id, briefing_type, fire_time), f"{briefing_type} briefing precompute")
+            for fire_time, chat_id, briefing_type in _pop(_heap, now):
+                # Off the heap until _deliver reschedules it.
+                _next_fire.pop((chat_id, briefing_type), None)
+                background.spawn(_tasks, _deliver(app, chat_id, briefing_type, fire_time), f"{briefing_type} briefing")
         except Exception:
             logger.exception("Error in briefing loop")
 
+        timeouts = [heap[0][0] - time.time() for heap in (_heap, _precompute_heap) if heap]
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=max(min(timeouts), 0) if timeouts else None)
+        except asyncio.TimeoutError:
+            pass
+
 
 async def start_briefings(app):
+    global _loop, _wakeup, _semaphore
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _semaphore = asyncio.Semaphore(BRIEFING_MAX_CONCURRENCY)
     asyncio.create_task(briefing_loop(app))
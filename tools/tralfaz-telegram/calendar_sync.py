@@ -0,0 +1,165 @@
+"""Write-behind Google Calendar sync.
+
+Appointment changes are recorded in the calendar_outbox table in the same
+transaction as the appointment itself (see database.save_appointment and
+cancel_appointment). A background task drains the outbox through the
+Calendar API's batch endpoint, retries failures with exponential backoff,
+and fills in google_event_id as creates complete.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from googleapiclient.errors import HttpError
+
+import database
+import google_calendar
+from config import (
+    CALENDAR_SYNC_ENABLED,
+    CALENDAR_BATCH_SIZE,
+    CALENDAR_SYNC_INTERVAL,
+    CALENDAR_RETRY_BASE,
+    CALENDAR_RETRY_MAX,
+    CALENDAR_MAX_ATTEMPTS,
+)
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+# Whether the last drain could reach Google, so an outage is logged once.
+_available = True
+
+
+def notify():
+    """Wake the sync task after an outbox write. Safe to call from any thread."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(CALENDAR_RETRY_BASE * (2 ** attempts), CALENDAR_RETRY_MAX)
+
+
+def _fail(row: dict, error: str, counts: dict):
+    counts["failed"] += 1
+    if row["attempts"] + 1 >= CALENDAR_MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on calendar %s (outbox %s) after %s attempts: %s",
+            row["op"], row["id"], row["attempts"] + 1, error,
+        )
+        database.complete_outbox(row["id"])
+        return
+    delay = _retry_delay(row["attempts"])
+    logger.warning("Calendar %s (outbox %s) failed, retrying in %.0fs: %s", row["op"], row["id"], delay, error)
+    database.defer_outbox(row["id"], error, time.time() + delay)
+
+
+def _on_result(row: dict, counts: dict, response, exception):
+    if row["op"] == "create":
+        if exception is not None:
+            _fail(row, str(exception), counts)
+            return
+        event_id = response["id"]
+        if not database.set_google_event_id(row["appointment_id"], event_id):
+            # Cancelled while the create was in flight.
+            database.enqueue_calendar_delete(event_id)
+        logger.info("Created Google Calendar event %s for '%s'", event_id, row["title"])
+    else:
+        gone = isinstance(exception, HttpError) and exception.resp.status in (404, 410)
+        if exception is not None and not gone:
+            _fail(row, str(exception), counts)
+            return
+        logger.info("Deleted Google Calendar event %s", row["google_event_id"])
+    database.complete_outbox(row["id"])
+    counts["synced"] += 1
+
+
+def drain(include_deferred: bool = False) -> dict:
+    """Push every ready outbox operation to Google, one batch request per chunk.
+
+    Returns counts of synced and failed operations. Blocking; run it in a
+    worker thread from async code.
+    """
+    global _available
+    counts = {"synced": 0, "failed": 0}
+    service = google_calendar.get_service()
+    if service is None:
+        # Rows stay queued for when the credentials work again.
+        if _available:
+            logger.warning("Google Calendar unavailable; keeping queued changes until it is back")
+        _available = False
+        return counts
+    if not _available:
+        logger.info("Google Calendar available again")
+    _available = True
+
+    last_id = 0
+    while True:
+        rows = database.get_pending_outbox(CALENDAR_BATCH_SIZE, last_id, include_deferred)
+        if not rows:
+            return counts
+        last_id = rows[-1]["id"]
+
+        batch_rows = {}
+        batch = google_calendar.new_batch(
+            service,
+            lambda request_id, response, exception: _on_result(
+                batch_rows[request_id], counts, response, exception
+            ),
+        )
+        for row in rows:
+            if row["op"] == "create" and row["title"] is None:
+                # Appointment vanished before its create ran.
+                database.complete_outbox(row["id"])
+                continue
+            try:
+                if row["op"] == "create":
+                    request = google_calendar.insert_request(
+                        service, row["title"], row["datetime"], row["reminder_minutes_before"]
+                    )
+                else:
+                    request = google_calendar.delete_request(service, row["google_event_id"])
+            except Exception as exc:
+                _fail(row, str(exc), counts)
+                continue
+            request_id = str(row["id"])
+            batch_rows[request_id] = row
+            batch.add(request, request_id=request_id)
+
+        if not batch_rows:
+            continue
+        try:
+            google_calendar.execute_batch(batch)
+        except Exception as exc:
+            logger.exception("Calendar batch request failed")
+            for row in batch_rows.values():
+                _fail(row, str(exc), counts)
+
+
+async def sync_loop():
+    logger.info("Calendar sync background task started")
+    while True:
+        try:
+            counts = await asyncio.to_thread(drain)
+            if counts["synced"] or counts["failed"]:
+                logger.info("Calendar sync: %(synced)s synced, %(failed)s failed", counts)
+        except Exception:
+            logger.exception("Error in calendar sync loop")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=CALENDAR_SYNC_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def start_calendar_sync(app):
+    global _loop, _wakeup
+    if not CALENDAR_SYNC_ENABLED:
+        logger.info("No Google credentials; calendar sync disabled")
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    asyncio.create_task(sync_loop())
@@ -1,15 +1,38 @@
+import asyncio
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
 
 import anthropic
 
+import briefings
+import calendar_sync
 import database
-import google_calendar
-from config import ANTHROPIC_API_KEY, CLAUDE_MODEL, CLAUDE_MAX_TOKENS, get_system_prompt
+import metrics
+import reminders
+from config import (
+    ANTHROPIC_API_KEY,
+    CLAUDE_MODEL,
+    CLAUDE_MAX_TOKENS,
+    CLAUDE_MAX_CONCURRENCY,
+    TOOL_TIMEOUT,
+    TOOL_MAX_WORKERS,
+    SEARCH_HISTORY_LIMIT,
+    get_system_prompt,
+)
 
 logger = logging.getLogger(__name__)
 
-_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+
+# Caps in-flight Claude requests across all chats.
+_semaphore = asyncio.Semaphore(CLAUDE_MAX_CONCURRENCY)
+
+# Tools do blocking SQLite and Google Calendar I/O; they get their own
+# pool so a hung calendar call can't starve asyncio.to_thread users.
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tralfaz-tool")
 
 TOOLS = [
     {
@@ -59,23 +82,65 @@ TOOLS = [
             "required": ["appointment_id"],
         },
     },
+    {
+        "name": "search_history",
+        "description": (
+            "Search earlier messages in this conversation that are no longer in view. "
+            "Returns the most relevant snippets, best match first."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Keywords to look for, e.g. 'dentist Henderson'",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": f"Maximum number of snippets to return (default {SEARCH_HISTORY_LIMIT})",
+                },
+            },
+            "required": ["query"],
+        },
+    },
 ]
 
+# Cache breakpoint on the last tool: TOOLS is the start of every request
+# prefix, followed by the static system block (which carries its own
+# breakpoint, see config.get_system_prompt).
+TOOLS[-1]["cache_control"] = {"type": "ephemeral"}
+
+_usage_stats = {
+    "requests": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+}
+
 
 def _execute_tool(name: str, tool_input: dict, chat_id: int) -> str:
+    with metrics.span(f"tool.{name}"):
+        return _dispatch_tool(name, tool_input, chat_id)
+
+
+def _dispatch_tool(name: str, tool_input: dict, chat_id: int) -> str:
     if name == "save_appointment":
         reminder_minutes = tool_input.get("reminder_minutes", 30)
+        start_epoch, remind_at = database.appointment_epochs(tool_input["datetime"], reminder_minutes)
+        if start_epoch is None:
+            # Nothing is stored, so the model asks again rather than saving
+            # an appointment no listing or reminder would ever find.
+            return json.dumps({"error": "unrecognised datetime, use ISO 8601"})
         appt_id = database.save_appointment(
             chat_id=chat_id,
             title=tool_input["title"],
             dt=tool_input["datetime"],
             reminder_minutes=reminder_minutes,
         )
-        event_id = google_calendar.create_event(
-            tool_input["title"], tool_input["datetime"], reminder_minutes
-        )
-        if event_id:
-            database.set_google_event_id(appt_id, event_id)
+        calendar_sync.notify()
+        reminders.schedule(appt_id, remind_at)
+        briefings.invalidate(chat_id)
         return json.dumps({"success": True, "appointment_id": appt_id})
 
     elif name == "list_appointments":
@@ -83,17 +148,102 @@ def _execute_tool(name: str, tool_input: dict, chat_id: int) -> str:
         return json.dumps({"appointments": appointments})
 
     elif name == "cancel_appointment":
-        appt = database.get_appointment(tool_input["appointment_id"], chat_id)
-        if appt and appt.get("google_event_id"):
-            google_calendar.delete_event(appt["google_event_id"])
         deleted = database.cancel_appointment(chat_id, tool_input["appointment_id"])
+        if deleted:
+            calendar_sync.notify()
+            reminders.unschedule(tool_input["appointment_id"])
+            briefings.invalidate(chat_id)
         return json.dumps({"success": deleted})
 
+    elif name == "search_history":
+        limit = min(tool_input.get("limit") or SEARCH_HISTORY_LIMIT, 20)
+        results = database.search_messages(chat_id, tool_input["query"], limit)
+        return json.dumps({"results": results})
+
     return json.dumps({"error": f"Unknown tool: {name}"})
 
 
-def get_response_with_system(system: str, messages: list[dict]) -> str:
-    response = _client.messages.create(
+def usage_stats() -> dict:
+    cached = _usage_stats["cache_read_input_tokens"]
+    prompt = _usage_stats["input_tokens"] + cached + _usage_stats["cache_creation_input_tokens"]
+    return {**_usage_stats, "cache_hit_rate": cached / prompt if prompt else 0.0}
+
+
+def _record_usage(response):
+    usage = response.usage
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    _usage_stats["requests"] += 1
+    _usage_stats["input_tokens"] += usage.input_tokens
+    _usage_stats["output_tokens"] += usage.output_tokens
+    _usage_stats["cache_read_input_tokens"] += cache_read
+    _usage_stats["cache_creation_input_tokens"] += cache_write
+    logger.info(
+        "Claude usage: input=%s cache_read=%s cache_write=%s output=%s",
+        usage.input_tokens, cache_read, cache_write, usage.output_tokens,
+    )
+
+
+def _with_cache_breakpoint(messages: list[dict]) -> list[dict]:
+    """Return messages with a cache breakpoint on the last content block.
+
+    Within one turn the system prompt is fixed, so each tool loop iteration
+    can read everything up to the previous iteration's tool results from
+    the cache. The caller's message dicts are not modified.
+    """
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    content = list(content)
+    if not isinstance(content[-1], dict):
+        return messages
+    content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+    return messages[:-1] + [{**last, "content": content}]
+
+
+async def _create_message(**kwargs):
+    async with _semaphore:
+        with metrics.span("claude.request"):
+            response = await _client.messages.create(**kwargs)
+    _record_usage(response)
+    return response
+
+
+async def _run_tool(block, chat_id: int) -> dict:
+    logger.info("Tool call: %s(%s)", block.name, block.input)
+    tool_result = {"type": "tool_result", "tool_use_id": block.id}
+    try:
+        tool_result["content"] = await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(
+                _tool_executor, _execute_tool, block.name, block.input, chat_id
+            ),
+            timeout=TOOL_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        # The worker thread keeps running and may still finish the job;
+        # the model is told it is unconfirmed rather than holding the reply.
+        logger.warning("Tool %s timed out after %ss", block.name, TOOL_TIMEOUT)
+        tool_result["content"] = json.dumps({"error": f"{block.name} timed out; the result is unconfirmed"})
+        tool_result["is_error"] = True
+    except Exception:
+        logger.exception("Tool %s failed", block.name)
+        tool_result["content"] = json.dumps({"error": f"{block.name} failed"})
+        tool_result["is_error"] = True
+    logger.info("Tool result: %s", tool_result["content"])
+    return tool_result
+
+
+async def _run_tools(response, chat_id: int) -> list[dict]:
+    """Run every tool_use block of a turn concurrently, keeping their order."""
+    blocks = [block for block in response.content if block.type == "tool_use"]
+    return list(await asyncio.gather(*(_run_tool(block, chat_id) for block in blocks)))
+
+
+async def get_response_with_system(system: str, messages: list[dict]) -> str:
+    response = await _create_message(
         model=CLAUDE_MODEL,
         max_tokens=CLAUDE_MAX_TOKENS,
         system=system,
@@ -105,8 +255,8 @@ def get_response_with_system(system: str, messages: list[dict]) -> str:
     return ""
 
 
-def get_response(history: list[dict], chat_id: int = None) -> str:
-    system = get_system_prompt()
+async def get_response(history: list[dict], chat_id: int = None, summary: Optional[str] = None) -> str:
+    system = get_system_prompt(summary)
     kwargs = dict(
         model=CLAUDE_MODEL,
         max_tokens=CLAUDE_MAX_TOKENS,
@@ -121,8 +271,8 @@ def get_response(history: list[dict], chat_id: int = None) -> str:
     messages = list(history)
 
     while True:
-        kwargs["messages"] = messages
-        response = _client.messages.create(**kwargs)
+        kwargs["messages"] = _with_cache_breakpoint(messages)
+        response = await _create_message(**kwargs)
 
         if response.stop_reason != "tool_use":
             # Extract final text
@@ -132,16 +282,71 @@ def get_response(history: list[dict], chat_id: int = None) -> str:
             return ""
 
         # Process tool calls
-        tool_results = []
-        for block in response.content:
-            if block.type == "tool_use":
-                logger.info("Tool call: %s(%s)", block.name, block.input)
-                result = _execute_tool(block.name, block.input, chat_id)
-                logger.info("Tool result: %s", result)
-                tool_results.append(
-                    {"type": "tool_result", "tool_use_id": block.id, "content": result}
-                )
+        tool_results = await _run_tools(response, chat_id)
 
         # Append assistant response + tool results for the next loop iteration
         messages.append({"role": "assistant", "content": response.content})
         messages.append({"role": "user", "content": tool_results})
+
+
+async def stream_response(
+    history: list[dict], chat_id: int, on_text: Callable[[str], Awaitable[None]], summary: Optional[str] = None
+) -> str:
+    """Like get_response, but streams text deltas to on_text as they arrive.
+
+    Text from every turn of the tool loop is passed through, so a preamble
+    such as "Let me note that down" shows up before the tool call runs.
+    on_text runs in order on a separate task, so slow callbacks (Telegram
+    edits) neither hold _semaphore nor stall the API stream. Returns the
+    full text that was streamed, once on_text has seen all of it.
+    """
+    kwargs = dict(
+        model=CLAUDE_MODEL,
+        max_tokens=CLAUDE_MAX_TOKENS,
+        system=get_system_prompt(summary),
+        tools=TOOLS,
+    )
+    messages = list(history)
+    streamed = []
+    deltas: asyncio.Queue = asyncio.Queue()
+
+    async def deliver():
+        while (text := await deltas.get()) is not None:
+            await on_text(text)
+
+    def emit(text: str):
+        streamed.append(text)
+        deltas.put_nowait(text)
+
+    delivery = asyncio.create_task(deliver())
+    try:
+        while True:
+            separator = "\n\n" if streamed else ""
+            async with _semaphore, _client.messages.stream(messages=_with_cache_breakpoint(messages), **kwargs) as stream:
+                started = time.perf_counter()
+                async for text in stream.text_stream:
+                    if separator:
+                        emit(separator)
+                        separator = ""
+                    emit(text)
+                response = await stream.get_final_message()
+                metrics.observe("claude.stream", time.perf_counter() - started)
+            _record_usage(response)
+
+            if response.stop_reason != "tool_use":
+                break
+
+            tool_results = await _run_tools(response, chat_id)
+
+            messages.append({"role": "assistant", "content": response.content})
+            messages.append({"role": "user", "content": tool_results})
+    except BaseException:
+        delivery.cancel()
+        raise
+
+    deltas.put_nowait(None)
+    await delivery
+    return "".join(streamed)
+
+
+metrics.register_gauges("claude", usage_stats)
@@ -1,12 +1,19 @@
 import os
 import sys
-from datetime import datetime
+from datetime import date, datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
 
 # --- Required environment variables (fail fast) ---
 
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# Optional: the public HTTPS URL Telegram should post updates to. When set,
+# the bot serves a webhook instead of long polling, and
+# TELEGRAM_WEBHOOK_SECRET (1-256 of A-Z, a-z, 0-9, _ and -) is required.
+TELEGRAM_WEBHOOK_URL = os.environ.get("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.environ.get("TELEGRAM_WEBHOOK_SECRET")
 
 _missing = []
 if not TELEGRAM_BOT_TOKEN:
@@ -15,6 +22,8 @@ if not ANTHROPIC_API_KEY:
     _missing.append("ANTHROPIC_API_KEY")
 if not OPENAI_API_KEY:
     _missing.append("OPENAI_API_KEY")
+if TELEGRAM_WEBHOOK_URL and not TELEGRAM_WEBHOOK_SECRET:
+    _missing.append("TELEGRAM_WEBHOOK_SECRET")
 
 if _missing:
     print(f"ERROR: Missing required environment variables: {', '.join(_missing)}", file=sys.stderr)
@@ -24,12 +33,36 @@ if _missing:
 
 CLAUDE_MODEL = "claude-sonnet-4-20250514"
 CLAUDE_MAX_TOKENS = 1024
-MAX_HISTORY_MESSAGES = 40
+CLAUDE_MAX_CONCURRENCY = 16
+CONCURRENT_UPDATES = 64
+TOOL_TIMEOUT = 15.0
+TOOL_MAX_WORKERS = 8
+MAX_HISTORY_MESSAGES = 20
+SEARCH_HISTORY_LIMIT = 5
+SEARCH_HISTORY_CANDIDATES = 500
+MESSAGE_RETENTION_DAYS = 90
+RETENTION_BATCH_SIZE = 1000
+RETENTION_INTERVAL = 6 * 3600
+RETENTION_VACUUM_PAGES = 2000
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_COMPACT_TARGET = 1000
+HISTORY_MIN_RECENT_MESSAGES = 6
+STREAM_REPLIES = True
+STREAM_EDIT_INTERVAL = 1.0
 DEFAULT_REMINDER_MINUTES = 30
-REMINDER_CHECK_INTERVAL = 60
+REMINDER_RESCAN_INTERVAL = 900
+REMINDER_MAX_CONCURRENCY = 16
+# Reminder voice notes are synthesized this long before they fire.
+REMINDER_PREFETCH_SECONDS = 300
 OWNER_CHAT_ID = 7122294517
+# Defaults for new briefing schedules; each chat's own live in briefing_schedules.
 MORNING_BRIEFING_HOUR = 6
 EVENING_BRIEFING_HOUR = 21
+BRIEFING_MAX_CONCURRENCY = 8
+# Briefings are rendered (and their audio synthesized) this long before they go out.
+BRIEFING_PRECOMPUTE_SECONDS = 1800
+# A briefing missed while the bot was down is still sent if at most this late.
+BRIEFING_CATCHUP_SECONDS = 3 * 3600
 
 _BASE_PROMPT = (
     "You are Tralfaz, a snooty but deeply loyal British butler in the style of "
@@ -39,23 +72,50 @@ _BASE_PROMPT = (
 )
 
 
-def get_system_prompt() -> str:
-    now = datetime.now()
-    return (
-        f"{_BASE_PROMPT}\n\n"
-        f"Current date and time: {now.strftime('%A, %B %d, %Y at %I:%M %p')}.\n\n"
-        "You have access to appointment management tools. When Sir mentions an "
-        "appointment, meeting, or scheduled event, use the save_appointment tool to "
-        "record it. Use your knowledge of the current date/time to resolve relative "
-        "dates like 'tomorrow', 'next Tuesday', etc. into ISO 8601 datetime strings. "
-        "If no specific time is given, use a sensible default (noon for meals, "
-        "9 AM for generic appointments). Always confirm what you saved."
-    )
-
-def get_briefing_prompt(briefing_type: str, appointments_text: str) -> str:
-    now = datetime.now()
-    day_type = "weekend" if now.weekday() >= 5 else "weekday"
-    date_str = now.strftime("%A, %B %d, %Y")
+# Static part of the chat system prompt. It comes right after TOOLS in the
+# request prefix and is marked cacheable, so it must not vary per call; the
+# current time goes in a separate block after it.
+_CHAT_PROMPT = (
+    f"{_BASE_PROMPT}\n\n"
+    "You have access to appointment management tools. When Sir mentions an "
+    "appointment, meeting, or scheduled event, use the save_appointment tool to "
+    "record it. Use the current date/time given below to resolve relative "
+    "dates like 'tomorrow', 'next Tuesday', etc. into ISO 8601 datetime strings. "
+    "If no specific time is given, use a sensible default (noon for meals, "
+    "9 AM for generic appointments). Always confirm what you saved.\n\n"
+    "Only the most recent messages are shown to you. If Sir refers to something "
+    "discussed earlier that you can't see, use the search_history tool to look "
+    "it up rather than guessing."
+)
+
+
+def get_system_prompt(summary: Optional[str] = None) -> list[dict]:
+    # Claude's naive datetimes are read in APPOINTMENT_TIMEZONE, so show it that clock.
+    now = datetime.now(ZoneInfo(APPOINTMENT_TIMEZONE))
+    blocks = [{"type": "text", "text": _CHAT_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    if summary:
+        blocks.append({
+            "type": "text",
+            "text": f"Summary of the earlier conversation with Sir (older messages are not shown):\n{summary}",
+        })
+    blocks.append({"type": "text", "text": f"Current date and time: {now.strftime('%A, %B %d, %Y at %I:%M %p')}."})
+    return blocks
+
+
+SUMMARY_PROMPT = (
+    "You maintain the running memory of a conversation between Sir and his butler, "
+    "Tralfaz. Merge the previous summary with the new messages into one updated "
+    "summary. Keep facts that may matter later: names, preferences, plans, "
+    "appointments discussed, open requests and promises made. Drop pleasantries. "
+    "Write plain prose in the third person, at most 250 words."
+)
+
+
+def get_briefing_prompt(briefing_type: str, appointments_text: str, day: Optional[date] = None) -> str:
+    # day lets briefings be rendered ahead of the date they're delivered on.
+    day = day or datetime.now(ZoneInfo(APPOINTMENT_TIMEZONE)).date()
+    day_type = "weekend" if day.weekday() >= 5 else "weekday"
+    date_str = day.strftime("%A, %B %d, %Y")
 
     if briefing_type == "morning":
         return (
@@ -76,11 +136,79 @@ def get_briefing_prompt(briefing_type: str, appointments_text: str) -> str:
         )
 
 
+# Text-to-speech
+TTS_MODEL = "tts-1"
+TTS_VOICE = "nova"
+TTS_FORMAT = "opus"
+TTS_MAX_PARALLEL = 3
+TTS_CHUNK_CHARS = 400
+TTS_STITCH_SEGMENTS = False
+
+# Speech API HTTP client (shared, keep-alive)
+VOICE_HTTP_MAX_CONNECTIONS = 10
+VOICE_HTTP_MAX_KEEPALIVE = 5
+VOICE_HTTP_KEEPALIVE_EXPIRY = 120.0
+VOICE_HTTP_CONNECT_TIMEOUT = 10.0
+WHISPER_TIMEOUT = 30.0
+TTS_TIMEOUT = 60.0
+
 # Paths (same directory as this script)
 _SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(_SCRIPT_DIR, "conversations.db")
 
+# SQLite connection tuning
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16 * 1024
+DB_MMAP_SIZE = 128 * 1024 * 1024
+DB_STATEMENT_CACHE = 256
+
 # Google Calendar
 GOOGLE_CLIENT_SECRET_PATH = os.path.join(_SCRIPT_DIR, "client_secret.json")
 GOOGLE_CREDENTIALS_PATH = os.path.join(_SCRIPT_DIR, "google_credentials.json")
 GOOGLE_CALENDAR_TIMEZONE = "America/New_York"
+# Naive appointment times from Claude are wall-clock times in this zone.
+APPOINTMENT_TIMEZONE = GOOGLE_CALENDAR_TIMEZONE
+GOOGLE_HTTP_TIMEOUT = 10
+GOOGLE_TOKEN_REFRESH_MARGIN = 300
+GOOGLE_TOKEN_RETRY_INTERVAL = 600
+# Calendar sync is on once setup_google_auth.py has written credentials.
+# Without it appointment changes aren't queued for Google at all; run
+# sync_existing.py after setting it up to push existing appointments.
+CALENDAR_SYNC_ENABLED = os.path.exists(GOOGLE_CREDENTIALS_PATH)
+
+# Calendar outbox sync
+CALENDAR_BATCH_SIZE = 50
+CALENDAR_SYNC_INTERVAL = 60
+CALENDAR_RETRY_BASE = 30
+CALENDAR_RETRY_MAX = 3600
+CALENDAR_MAX_ATTEMPTS = 10
+
+# TTS audio cache (memory hot tier + on-disk opus blobs, both LRU)
+TTS_CACHE_DIR = os.path.join(_SCRIPT_DIR, "tts_cache")
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+TTS_MEMORY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Latency metrics (/stats, plus a Prometheus endpoint on localhost; port 0 disables it)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+METRICS_SAMPLE_SIZE = 1024
+
+# Event-loop lag watchdog and /profile sampling profiler
+LOOP_LAG_INTERVAL = 0.1
+LOOP_LAG_THRESHOLD = 0.25
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+
+# Outgoing Telegram send limits for background fan-out (messages per second)
+TELEGRAM_GLOBAL_RATE = 25
+TELEGRAM_GLOBAL_BURST = 25
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_CHAT_BURST = 3
+
+# Webhook server (used when TELEGRAM_WEBHOOK_URL is set). It listens locally
+# behind a TLS-terminating reverse proxy or load balancer; the URL path of
+# TELEGRAM_WEBHOOK_URL is served as-is.
+WEBHOOK_LISTEN = "127.0.0.1"
+WEBHOOK_PORT = 8443
+WEBHOOK_MAX_CONNECTIONS = 40
@@ -1,212 +1,914 @@
+import os
+import re
 import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
 from typing import Optional
-
-from config import DB_PATH, MAX_HISTORY_MESSAGES, DEFAULT_REMINDER_MINUTES
+from zoneinfo import ZoneInfo
+
+from config import (
+    DB_PATH,
+    MAX_HISTORY_MESSAGES,
+    SEARCH_HISTORY_LIMIT,
+    SEARCH_HISTORY_CANDIDATES,
+    DEFAULT_REMINDER_MINUTES,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE,
+    APPOINTMENT_TIMEZONE,
+    CALENDAR_SYNC_ENABLED,
+    OWNER_CHAT_ID,
+    MORNING_BRIEFING_HOUR,
+    EVENING_BRIEFING_HOUR,
+)
+
+_TZ = ZoneInfo(APPOINTMENT_TIMEZONE)
+
+# PRAGMA user_version: 1 = start_epoch/remind_at normalized to APPOINTMENT_TIMEZONE.
+_SCHEMA_VERSION = 1
+
+# --- Connection management ---
+#
+# Each thread keeps one long-lived connection (asyncio.to_thread workers,
+# the main thread, scripts). Statements are reused through sqlite3's
+# per-connection statement cache, so the SQL strings below are only
+# prepared once per thread.
+
+_local = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    # Must precede journal_mode: switching to WAL writes the header of a new
+    # database, after which auto_vacuum can only change through a VACUUM.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        _local.conn = conn
+        _local.generation = _generation
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connections():
+    """Close every pooled connection. Threads reconnect lazily afterwards."""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    conn = get_connection()
+    # New databases get incremental auto-vacuum in _connect; older files
+    # switch over with a one-time full VACUUM.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        vacuum()
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
         )
-        """
-    )
-    conn.execute(
-        "CREATE INDEX IF NOT EXISTS idx_chat_id ON messages (chat_id)"
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            datetime TEXT NOT NULL,
-            reminder_minutes_before INTEGER DEFAULT 30,
-            reminded INTEGER DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_id ON messages (chat_id)"
         )
-        """
-    )
-    conn.execute(
-        "CREATE INDEX IF NOT EXISTS idx_appt_chat_id ON appointments (chat_id)"
-    )
-    conn.commit()
-    conn.close()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS appointments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                datetime TEXT NOT NULL,
+                reminder_minutes_before INTEGER DEFAULT 30,
+                reminded INTEGER DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS calendar_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                appointment_id INTEGER,
+                google_event_id TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL DEFAULT 0,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON calendar_outbox (next_attempt_at)"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS voice_file_ids (
+                cache_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages_archive (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content BLOB NOT NULL,
+                timestamp DATETIME
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_archive_chat_id ON messages_archive (chat_id)"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                chat_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        # A NULL hour means that briefing is off; last_* hold the local date
+        # of the last one sent, so a restart neither repeats nor skips it.
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS briefing_schedules (
+                chat_id INTEGER PRIMARY KEY,
+                timezone TEXT NOT NULL,
+                morning_hour INTEGER,
+                evening_hour INTEGER,
+                last_morning TEXT,
+                last_evening TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+    _migrate_messages_fts()
     _migrate_appointments()
     _seed_appointments()
+    _seed_briefing_schedules()
 
 
 def store_message(chat_id: int, role: str, content: str):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
-        (chat_id, role, content),
-    )
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
+            (chat_id, role, content),
+        )
 
 
 def get_history(chat_id: int) -> list[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    rows = conn.execute(
+    """Recent messages not yet folded into the chat's summary, oldest first."""
+    rows = get_connection().execute(
         """
         SELECT role, content FROM (
             SELECT role, content, id
             FROM messages
             WHERE chat_id = ?
+              AND id > COALESCE((SELECT last_message_id FROM chat_summaries WHERE chat_id = ?), 0)
             ORDER BY id DESC
             LIMIT ?
         ) sub ORDER BY id ASC
         """,
-        (chat_id, MAX_HISTORY_MESSAGES),
+        (chat_id, chat_id, MAX_HISTORY_MESSAGES),
     ).fetchall()
-    conn.close()
     return [{"role": role, "content": content} for role, content in rows]
 
 
+def get_last_assistant_message(chat_id: int) -> Optional[str]:
+    row = get_connection().execute(
+        "SELECT content FROM messages WHERE chat_id = ? AND role = 'assistant' ORDER BY id DESC LIMIT 1",
+        (chat_id,),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def get_unsummarized_messages(chat_id: int, after_id: int) -> list[dict]:
+    rows = get_connection().execute(
+        "SELECT id, role, content FROM messages WHERE chat_id = ? AND id > ? ORDER BY id ASC",
+        (chat_id, after_id),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
 def clear_history(chat_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM messages_archive WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chat_summaries WHERE chat_id = ?", (chat_id,))
+
+
+def _fts_query(text: str) -> Optional[str]:
+    # Free text from the model is reduced to quoted terms OR'ed together so
+    # FTS5 query syntax in it can't cause errors; bm25 ranks the matches.
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+def search_messages(chat_id: int, query: str, limit: int = SEARCH_HISTORY_LIMIT) -> list[dict]:
+    """Best full-text matches for query among the chat's messages older than the visible window."""
+    match = _fts_query(query)
+    if match is None:
+        return []
+    conn = get_connection()
+    floor = conn.execute(
+        """
+        SELECT MIN(id) FROM (
+            SELECT id FROM messages
+            WHERE chat_id = ?
+              AND id > COALESCE((SELECT last_message_id FROM chat_summaries WHERE chat_id = ?), 0)
+            ORDER BY id DESC
+            LIMIT ?
+        )
+        """,
+        (chat_id, chat_id, MAX_HISTORY_MESSAGES),
+    ).fetchone()[0]
+    # Only the most recent SEARCH_HISTORY_CANDIDATES matches are ranked, so
+    # a common word in a long chat doesn't mean scoring every message.
+    rows = conn.execute(
+        """
+        SELECT m.id, m.role, m.timestamp, hits.snippet
+        FROM (
+            SELECT rowid, rank, snippet(messages_fts, 1, '', '', '…', 24) AS snippet
+            FROM messages_fts
+            WHERE messages_fts MATCH ? AND rowid < ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        ) hits
+        JOIN messages m ON m.id = hits.rowid
+        WHERE m.chat_id = ?
+        ORDER BY hits.rank
+        LIMIT ?
+        """,
+        (
+            f"chat_id : {abs(chat_id)} AND content : ({match})",
+            floor or 2**63 - 1,
+            SEARCH_HISTORY_CANDIDATES,
+            chat_id,
+            limit,
+        ),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- Retention ---
+
+
+def archive_messages(older_than_days: int, batch_size: int, after_id: int = 0) -> tuple[int, int]:
+    """Move one batch of old messages outside their chat's live window to the archive.
+
+    A message is kept live while it is newer than older_than_days, not yet
+    folded into the chat's summary, or still within the last
+    MAX_HISTORY_MESSAGES of its chat. Content is stored zlib-compressed.
+    Returns (archived, last archived id); pass the id back in as after_id
+    for the next batch until archived is 0.
+    """
+    conn = get_connection()
+    cutoff = conn.execute(
+        "SELECT id FROM messages WHERE id > ? AND timestamp >= datetime('now', ?) ORDER BY id LIMIT 1",
+        (after_id, f"-{older_than_days} days"),
+    ).fetchone()
+    # ids grow with time, so everything below the first recent row is old.
+    cutoff_id = cutoff[0] if cutoff else 2**63 - 1
+    rows = conn.execute(
+        """
+        SELECT m.id, m.chat_id, m.role, m.content, m.timestamp
+        FROM messages m
+        WHERE m.id > ? AND m.id < ?
+          AND m.id <= MIN(
+              COALESCE((SELECT last_message_id FROM chat_summaries s WHERE s.chat_id = m.chat_id), 0),
+              COALESCE((
+                  SELECT id FROM messages r WHERE r.chat_id = m.chat_id
+                  ORDER BY id DESC LIMIT 1 OFFSET ?
+              ), 0)
+          )
+        ORDER BY m.id
+        LIMIT ?
+        """,
+        (after_id, cutoff_id, MAX_HISTORY_MESSAGES, batch_size),
+    ).fetchall()
+    if not rows:
+        return 0, 0
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO messages_archive (id, chat_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [
+                (row["id"], row["chat_id"], row["role"], zlib.compress(row["content"].encode("utf-8")), row["timestamp"])
+                for row in rows
+            ],
+        )
+        conn.executemany("DELETE FROM messages WHERE id = ?", [(row["id"],) for row in rows])
+    return len(rows), rows[-1]["id"]
+
+
+def get_archived_messages(chat_id: int, limit: int = 100) -> list[dict]:
+    rows = get_connection().execute(
+        """
+        SELECT id, role, content, timestamp FROM messages_archive
+        WHERE chat_id = ? ORDER BY id DESC LIMIT ?
+        """,
+        (chat_id, limit),
+    ).fetchall()
+    return [
+        {**dict(row), "content": zlib.decompress(row["content"]).decode("utf-8")}
+        for row in reversed(rows)
+    ]
+
+
+def incremental_vacuum(pages: int) -> int:
+    """Return up to pages free pages to the filesystem. Returns the free pages left."""
+    conn = get_connection()
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def vacuum():
+    """Rebuild the database file, switching it to incremental auto-vacuum."""
+    conn = get_connection()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def database_stats() -> dict:
+    conn = get_connection()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    stats = {
+        "file_bytes": os.path.getsize(DB_PATH),
+        "wal_bytes": os.path.getsize(f"{DB_PATH}-wal") if os.path.exists(f"{DB_PATH}-wal") else 0,
+        "page_size": page_size,
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+        "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "auto_vacuum": ("none", "full", "incremental")[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+    }
+    stats["free_bytes"] = stats["free_pages"] * page_size
+    live = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM messages").fetchone()
+    archived = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM messages_archive").fetchone()
+    stats["messages"], stats["message_bytes"] = live
+    stats["archived_messages"], stats["archived_bytes"] = archived
+    return stats
+
+
+# --- Chat summaries ---
+
+
+def get_chat_summary(chat_id: int) -> Optional[dict]:
+    row = get_connection().execute(
+        "SELECT summary, last_message_id FROM chat_summaries WHERE chat_id = ?",
+        (chat_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def save_chat_summary(chat_id: int, summary: str, last_message_id: int, expected_last_id: int) -> bool:
+    """Store a new summary unless it is stale.
+
+    Stale means another compaction moved the summary past expected_last_id,
+    or the chat's history was cleared while this one was being written.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "SELECT last_message_id FROM chat_summaries WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        if (row[0] if row else 0) != expected_last_id:
+            return False
+        # Message ids are never reused (AUTOINCREMENT), so a missing one was cleared.
+        folded = conn.execute(
+            """
+            SELECT 1 FROM messages WHERE id = ? AND chat_id = ?
+            UNION ALL
+            SELECT 1 FROM messages_archive WHERE id = ? AND chat_id = ?
+            """,
+            (last_message_id, chat_id, last_message_id, chat_id),
+        ).fetchone()
+        if folded is None:
+            return False
+        conn.execute(
+            """
+            INSERT INTO chat_summaries (chat_id, summary, last_message_id, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                summary = excluded.summary,
+                last_message_id = excluded.last_message_id,
+                updated_at = excluded.updated_at
+            """,
+            (chat_id, summary, last_message_id),
+        )
+    return True
 
 
 # --- Appointments ---
 
 
+def appointment_epochs(dt: str, reminder_minutes: int) -> tuple[Optional[int], Optional[int]]:
+    """Return (start_epoch, remind_at) for an ISO datetime, or Nones if unparseable.
+
+    Naive datetimes are read as wall-clock time in APPOINTMENT_TIMEZONE, so
+    the result doesn't depend on the host's local timezone.
+    """
+    try:
+        start = datetime.fromisoformat(dt)
+    except (TypeError, ValueError):
+        return None, None
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=_TZ)
+    start_epoch = int(start.timestamp())
+    return start_epoch, start_epoch - (reminder_minutes or 0) * 60
+
+
+def local_now() -> datetime:
+    return datetime.now(_TZ)
+
+
+def local_today() -> date:
+    return local_now().date()
+
+
+def _day_bounds(day: date) -> tuple[int, int]:
+    """Epoch range [start, end) of a calendar day in APPOINTMENT_TIMEZONE."""
+    start = datetime(day.year, day.month, day.day, tzinfo=_TZ)
+    end = start + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
 def save_appointment(chat_id: int, title: str, dt: str, reminder_minutes: int = DEFAULT_REMINDER_MINUTES) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.execute(
-        "INSERT INTO appointments (chat_id, title, datetime, reminder_minutes_before) VALUES (?, ?, ?, ?)",
-        (chat_id, title, dt, reminder_minutes),
-    )
-    conn.commit()
-    appt_id = cur.lastrowid
-    conn.close()
-    return appt_id
+    """Insert an appointment and queue its Google Calendar create.
+
+    Raises ValueError if dt isn't an ISO datetime.
+    """
+    start_epoch, remind_at = appointment_epochs(dt, reminder_minutes)
+    if start_epoch is None:
+        raise ValueError(f"Unrecognised appointment datetime: {dt!r}")
+    conn = get_connection()
+    with conn:
+        cur = conn.execute(
+            """
+            INSERT INTO appointments
+                (chat_id, title, datetime, reminder_minutes_before, start_epoch, remind_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (chat_id, title, dt, reminder_minutes, start_epoch, remind_at),
+        )
+        if CALENDAR_SYNC_ENABLED:
+            conn.execute(
+                "INSERT INTO calendar_outbox (op, appointment_id) VALUES ('create', ?)",
+                (cur.lastrowid,),
+            )
+    return cur.lastrowid
 
 
 def list_appointments(chat_id: int) -> list[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
+    rows = get_connection().execute(
         """
         SELECT id, title, datetime, reminder_minutes_before, google_event_id
         FROM appointments
-        WHERE chat_id = ? AND datetime >= datetime('now', 'localtime')
-        ORDER BY datetime ASC
+        WHERE chat_id = ? AND start_epoch >= ?
+        ORDER BY start_epoch ASC
         """,
-        (chat_id,),
+        (chat_id, int(time.time())),
     ).fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
 
-def get_todays_appointments(chat_id: int) -> list[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
+def _appointments_between(chat_id: int, start_epoch: int, end_epoch: int) -> list[dict]:
+    rows = get_connection().execute(
         """
         SELECT id, title, datetime, reminder_minutes_before
         FROM appointments
-        WHERE chat_id = ? AND date(datetime) = date('now', 'localtime')
-        ORDER BY datetime ASC
+        WHERE chat_id = ? AND start_epoch >= ? AND start_epoch < ?
+        ORDER BY start_epoch ASC
         """,
-        (chat_id,),
+        (chat_id, start_epoch, end_epoch),
     ).fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
 
+def get_appointments_on(chat_id: int, day: date) -> list[dict]:
+    return _appointments_between(chat_id, *_day_bounds(day))
+
+
+def get_todays_appointments(chat_id: int) -> list[dict]:
+    return get_appointments_on(chat_id, local_today())
+
+
 def get_tomorrows_appointments(chat_id: int) -> list[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        """
-        SELECT id, title, datetime, reminder_minutes_before
-        FROM appointments
-        WHERE chat_id = ? AND date(datetime) = date('now', 'localtime', '+1 day')
-        ORDER BY datetime ASC
-        """,
-        (chat_id,),
-    ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return get_appointments_on(chat_id, local_today() + timedelta(days=1))
 
 
 def cancel_appointment(chat_id: int, appointment_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.execute(
-        "DELETE FROM appointments WHERE id = ? AND chat_id = ?",
-        (appointment_id, chat_id),
-    )
-    conn.commit()
-    deleted = cur.rowcount > 0
-    conn.close()
-    return deleted
+    """Delete an appointment and queue removal of its calendar event.
+
+    A create that hasn't been synced yet is simply dropped from the outbox.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "SELECT google_event_id FROM appointments WHERE id = ? AND chat_id = ?",
+            (appointment_id, chat_id),
+        ).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM appointments WHERE id = ?", (appointment_id,))
+        conn.execute(
+            "DELETE FROM calendar_outbox WHERE op = 'create' AND appointment_id = ?",
+            (appointment_id,),
+        )
+        if row["google_event_id"] and CALENDAR_SYNC_ENABLED:
+            conn.execute(
+                "INSERT INTO calendar_outbox (op, google_event_id) VALUES ('delete', ?)",
+                (row["google_event_id"],),
+            )
+    return True
 
 
 def get_appointment(appointment_id: int, chat_id: int) -> Optional[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    row = conn.execute(
+    row = get_connection().execute(
         "SELECT id, title, datetime, reminder_minutes_before, google_event_id FROM appointments WHERE id = ? AND chat_id = ?",
         (appointment_id, chat_id),
     ).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
-def set_google_event_id(appointment_id: int, event_id: str):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        "UPDATE appointments SET google_event_id = ? WHERE id = ?",
-        (event_id, appointment_id),
-    )
-    conn.commit()
-    conn.close()
+def set_google_event_id(appointment_id: int, event_id: str) -> bool:
+    """Record the calendar event for an appointment. False if it no longer exists."""
+    conn = get_connection()
+    with conn:
+        cur = conn.execute(
+            "UPDATE appointments SET google_event_id = ? WHERE id = ?",
+            (event_id, appointment_id),
+        )
+    return cur.rowcount > 0
 
 
 def get_due_reminders() -> list[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
+    now = int(time.time())
+    rows = get_connection().execute(
         """
-        SELECT id, chat_id, title, datetime, reminder_minutes_before
+        SELECT id, chat_id, title, datetime, reminder_minutes_before, start_epoch, remind_at
         FROM appointments
         WHERE reminded = 0
-          AND datetime >= datetime('now', 'localtime')
-          AND datetime <= datetime('now', 'localtime', '+' || reminder_minutes_before || ' minutes')
+          AND remind_at <= ?
+          AND start_epoch >= ?
+        """,
+        (now, now),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_upcoming_reminders() -> list[dict]:
+    """Every appointment that still needs a reminder, for the scheduler heap."""
+    rows = get_connection().execute(
         """
+        SELECT id, chat_id, title, datetime, reminder_minutes_before, start_epoch, remind_at
+        FROM appointments
+        WHERE reminded = 0
+          AND start_epoch >= ?
+        """,
+        (int(time.time()),),
     ).fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
 
+def get_unreminded_appointment(appointment_id: int) -> Optional[dict]:
+    row = get_connection().execute(
+        """
+        SELECT id, chat_id, title, datetime, reminder_minutes_before, start_epoch, remind_at
+        FROM appointments
+        WHERE id = ? AND reminded = 0
+        """,
+        (appointment_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
 def mark_reminded(appointment_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("UPDATE appointments SET reminded = 1 WHERE id = ?", (appointment_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE appointments SET reminded = 1 WHERE id = ?", (appointment_id,))
+
+
+# --- Google Calendar outbox ---
+
+
+def get_pending_outbox(limit: int, after_id: int = 0, include_deferred: bool = False) -> list[dict]:
+    """Outbox operations ready to run, oldest first, joined with appointment data."""
+    rows = get_connection().execute(
+        """
+        SELECT o.id, o.op, o.appointment_id, o.google_event_id, o.attempts,
+               a.title, a.datetime, a.reminder_minutes_before
+        FROM calendar_outbox o
+        LEFT JOIN appointments a ON a.id = o.appointment_id
+        WHERE o.id > ? AND o.next_attempt_at <= ?
+        ORDER BY o.id ASC
+        LIMIT ?
+        """,
+        (after_id, float("inf") if include_deferred else time.time(), limit),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def complete_outbox(outbox_id: int):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM calendar_outbox WHERE id = ?", (outbox_id,))
+
+
+def defer_outbox(outbox_id: int, error: str, next_attempt_at: float):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            UPDATE calendar_outbox
+            SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+            WHERE id = ?
+            """,
+            (error, next_attempt_at, outbox_id),
+        )
+
+
+def enqueue_calendar_delete(event_id: str):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO calendar_outbox (op, google_event_id) VALUES ('delete', ?)",
+            (event_id,),
+        )
+
+
+def enqueue_unsynced_appointments() -> int:
+    """Queue creates for future appointments that have no calendar event yet."""
+    conn = get_connection()
+    with conn:
+        cur = conn.execute(
+            """
+            INSERT INTO calendar_outbox (op, appointment_id)
+            SELECT 'create', a.id
+            FROM appointments a
+            WHERE a.google_event_id IS NULL
+              AND a.start_epoch >= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM calendar_outbox o
+                  WHERE o.op = 'create' AND o.appointment_id = a.id
+              )
+            ORDER BY a.start_epoch ASC
+            """,
+            (int(time.time()),),
+        )
+    return cur.rowcount
+
+
+# --- Briefing schedules ---
+
+_LAST_SENT_COLUMNS = {"morning": "last_morning", "evening": "last_evening"}
+
+
+def get_briefing_schedules() -> list[dict]:
+    rows = get_connection().execute(
+        """
+        SELECT chat_id, timezone, morning_hour, evening_hour, last_morning, last_evening
+        FROM briefing_schedules
+        WHERE morning_hour IS NOT NULL OR evening_hour IS NOT NULL
+        """
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_briefing_schedule(chat_id: int) -> Optional[dict]:
+    row = get_connection().execute(
+        """
+        SELECT chat_id, timezone, morning_hour, evening_hour, last_morning, last_evening
+        FROM briefing_schedules
+        WHERE chat_id = ?
+        """,
+        (chat_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def set_briefing_schedule(chat_id: int, timezone: str, morning_hour: Optional[int], evening_hour: Optional[int]):
+    """Create or change a chat's schedule, keeping its last-sent dates.
+
+    A new schedule counts today's briefings whose hour has already passed as
+    sent, so subscribing doesn't trigger an immediate catch-up briefing.
+    """
+    now = datetime.now(ZoneInfo(timezone))
+
+    def passed(hour: Optional[int]) -> Optional[str]:
+        return now.date().isoformat() if hour is not None and now.hour >= hour else None
+
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO briefing_schedules
+                (chat_id, timezone, morning_hour, evening_hour, last_morning, last_evening, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                timezone = excluded.timezone,
+                morning_hour = excluded.morning_hour,
+                evening_hour = excluded.evening_hour,
+                updated_at = excluded.updated_at
+            """,
+            (chat_id, timezone, morning_hour, evening_hour, passed(morning_hour), passed(evening_hour)),
+        )
+
+
+def claim_briefing(chat_id: int, briefing_type: str, day: date) -> bool:
+    """Record the briefing for day as sent; False if it already was."""
+    column = _LAST_SENT_COLUMNS[briefing_type]
+    conn = get_connection()
+    with conn:
+        cur = conn.execute(
+            f"""
+            UPDATE briefing_schedules SET {column} = ?
+            WHERE chat_id = ? AND ({column} IS NULL OR {column} < ?)
+            """,
+            (day.isoformat(), chat_id, day.isoformat()),
+        )
+    return cur.rowcount == 1
+
+
+# --- Telegram voice file IDs (TTS cache) ---
+
+
+def get_voice_file_id(cache_key: str) -> Optional[str]:
+    row = get_connection().execute(
+        "SELECT file_id FROM voice_file_ids WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_voice_file_id(cache_key: str, file_id: str):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO voice_file_ids (cache_key, file_id) VALUES (?, ?)",
+            (cache_key, file_id),
+        )
+
+
+def delete_voice_file_id(cache_key: str):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM voice_file_ids WHERE cache_key = ?", (cache_key,))
+
+
+def _migrate_messages_fts():
+    """Create the full-text index over messages and fill it from existing rows."""
+    conn = get_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).fetchone()
+    with conn:
+        if not exists:
+            # External-content table: the text lives only in messages. chat_id
+            # is indexed too so a search only walks one chat's postings.
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE messages_fts USING fts5(
+                    chat_id, content,
+                    content = 'messages', content_rowid = 'id',
+                    tokenize = 'porter unicode61'
+                )
+                """
+            )
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, chat_id, content)
+                VALUES (new.id, new.chat_id, new.content);
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, chat_id, content)
+                VALUES ('delete', old.id, old.chat_id, old.content);
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, chat_id, content)
+                VALUES ('delete', old.id, old.chat_id, old.content);
+                INSERT INTO messages_fts (rowid, chat_id, content)
+                VALUES (new.id, new.chat_id, new.content);
+            END
+            """
+        )
 
 
 def _migrate_appointments():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     columns = [row[1] for row in conn.execute("PRAGMA table_info(appointments)").fetchall()]
     if "google_event_id" not in columns:
-        conn.execute("ALTER TABLE appointments ADD COLUMN google_event_id TEXT")
-        conn.commit()
-    conn.close()
+        with conn:
+            conn.execute("ALTER TABLE appointments ADD COLUMN google_event_id TEXT")
+
+    # Precomputed epoch columns let the due-reminder query use an index
+    # instead of evaluating a datetime() expression on every row.
+    if "start_epoch" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE appointments ADD COLUMN start_epoch INTEGER")
+            conn.execute("ALTER TABLE appointments ADD COLUMN remind_at INTEGER")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+        # Epochs written before version 1 used the host's local timezone.
+        with conn:
+            conn.execute("UPDATE appointments SET start_epoch = NULL, remind_at = NULL")
+    _backfill_appointment_epochs()
+    with conn:
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_appt_pending_reminders
+            ON appointments (remind_at, start_epoch)
+            WHERE reminded = 0
+            """
+        )
+        # (chat_id, start_epoch) serves per-chat range queries and makes the
+        # old single-column chat index redundant.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_appt_chat_start ON appointments (chat_id, start_epoch)"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_appt_chat_id")
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+
+def _backfill_appointment_epochs(batch_size: int = 10000):
+    conn = get_connection()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT id, datetime, reminder_minutes_before FROM appointments
+            WHERE id > ? AND start_epoch IS NULL
+            ORDER BY id LIMIT ?
+            """,
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return
+        with conn:
+            conn.executemany(
+                "UPDATE appointments SET start_epoch = ?, remind_at = ? WHERE id = ?",
+                [(*appointment_epochs(row["datetime"], row["reminder_minutes_before"]), row["id"]) for row in rows],
+            )
+        last_id = rows[-1]["id"]
 
 
 def _seed_appointments():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     count = conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
     if count == 0:
         seeds = [
@@ -215,9 +917,18 @@ def _seed_appointments():
             (7122294517, "Dishwasher and microwave installation", "2026-03-03T13:00:00", 30),
             (7122294517, "Lunch with Liz", "2026-03-05T12:00:00", 30),
         ]
-        conn.executemany(
-            "INSERT INTO appointments (chat_id, title, datetime, reminder_minutes_before) VALUES (?, ?, ?, ?)",
-            seeds,
-        )
-        conn.commit()
-    conn.close()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO appointments
+                    (chat_id, title, datetime, reminder_minutes_before, start_epoch, remind_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [(*seed, *appointment_epochs(seed[2], seed[3])) for seed in seeds],
+            )
+
+
+def _seed_briefing_schedules():
+    conn = get_connection()
+    if conn.execute("SELECT COUNT(*) FROM briefing_schedules").fetchone()[0] == 0:
+        set_briefing_schedule(OWNER_CHAT_ID, APPOINTMENT_TIMEZONE, MORNING_BRIEFING_HOUR, EVENING_BRIEFING_HOUR)
@@ -1,79 +1,211 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 
-from config import GOOGLE_CREDENTIALS_PATH, GOOGLE_CALENDAR_TIMEZONE
+from config import (
+    CALENDAR_SYNC_ENABLED,
+    GOOGLE_CREDENTIALS_PATH,
+    GOOGLE_CALENDAR_TIMEZONE,
+    GOOGLE_HTTP_TIMEOUT,
+    GOOGLE_TOKEN_REFRESH_MARGIN,
+    GOOGLE_TOKEN_RETRY_INTERVAL,
+)
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
 
 
-def _get_credentials():
-    """Load and refresh OAuth2 credentials. Returns None if unavailable."""
+# Credentials and the service object are built once and kept for the life
+# of the process. Service objects are not thread-safe, so each worker
+# thread executes requests through its own authorized httplib2 client.
+_lock = threading.Lock()
+_creds: Optional[Credentials] = None
+_service = None
+_http_local = threading.local()
+_load_failed = False
+
+
+def _save_credentials(creds: Credentials):
+    """Write credentials atomically so a crash never leaves a torn file."""
+    directory = os.path.dirname(GOOGLE_CREDENTIALS_PATH)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".google_credentials.")
     try:
-        creds = Credentials.from_authorized_user_file(GOOGLE_CREDENTIALS_PATH, SCOPES)
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+        os.replace(tmp_path, GOOGLE_CREDENTIALS_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _refresh(creds: Credentials) -> bool:
+    try:
+        creds.refresh(Request())
+        _save_credentials(creds)
+        logger.info("Refreshed Google credentials (valid until %s UTC)", creds.expiry)
+        return True
     except Exception:
-        logger.warning("Google credentials file not found or invalid — calendar sync disabled")
-        return None
+        logger.warning("Failed to refresh Google credentials — calendar sync disabled")
+        return False
 
-    if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            with open(GOOGLE_CREDENTIALS_PATH, "w") as f:
-                f.write(creds.to_json())
-        except Exception:
-            logger.warning("Failed to refresh Google credentials — calendar sync disabled")
-            return None
 
-    return creds
+def _seconds_until_expiry(creds: Credentials) -> Optional[float]:
+    if creds.expiry is None:
+        return None
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (creds.expiry - now).total_seconds()
 
 
-def _get_service():
-    """Build Calendar API service. Returns None if credentials unavailable."""
+def _get_credentials():
+    """Return cached OAuth2 credentials, loading or refreshing them if needed."""
+    global _creds, _load_failed
+    with _lock:
+        if _creds is None:
+            try:
+                _creds = Credentials.from_authorized_user_file(GOOGLE_CREDENTIALS_PATH, SCOPES)
+            except Exception:
+                if not _load_failed:
+                    logger.warning("Google credentials file not found or invalid — calendar sync disabled")
+                _load_failed = True
+                return None
+
+        if _creds.expired and _creds.refresh_token:
+            if not _refresh(_creds):
+                return None
+
+        return _creds
+
+
+def get_service():
+    """Return the cached Calendar API service. Returns None if credentials unavailable."""
+    global _service
     creds = _get_credentials()
     if creds is None:
         return None
-    try:
-        return build("calendar", "v3", credentials=creds)
-    except Exception:
-        logger.exception("Failed to build Google Calendar service")
+    with _lock:
+        if _service is None:
+            try:
+                # The calendar v3 discovery document ships with the client
+                # library, so building never goes to the network.
+                _service = build(
+                    "calendar", "v3", credentials=creds,
+                    static_discovery=True, cache_discovery=False,
+                )
+            except Exception:
+                logger.exception("Failed to build Google Calendar service")
+                return None
+        return _service
+
+
+def _http():
+    """Return this thread's authorized HTTP client."""
+    http = getattr(_http_local, "http", None)
+    if http is None or http.credentials is not _creds:
+        http = AuthorizedHttp(_creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+        _http_local.http = http
+    return http
+
+
+def refresh_if_expiring() -> Optional[float]:
+    """Refresh credentials that expire within the margin.
+
+    Returns seconds until the next refresh is due, or None when there is
+    nothing to refresh.
+    """
+    creds = _get_credentials()
+    if creds is None or not creds.refresh_token:
+        return None
+    remaining = _seconds_until_expiry(creds)
+    if remaining is None:
         return None
+    if remaining <= GOOGLE_TOKEN_REFRESH_MARGIN:
+        with _lock:
+            if not _refresh(creds):
+                return None
+        remaining = _seconds_until_expiry(creds) or 0
+    return max(remaining - GOOGLE_TOKEN_REFRESH_MARGIN, 0)
+
+
+async def token_refresh_loop():
+    logger.info("Google token refresh task started")
+    while True:
+        try:
+            delay = await asyncio.to_thread(refresh_if_expiring)
+        except Exception:
+            logger.exception("Error refreshing Google credentials")
+            delay = None
+        if delay is None:
+            delay = GOOGLE_TOKEN_RETRY_INTERVAL
+        await asyncio.sleep(max(delay, 1))
+
+
+async def start_token_refresh(app):
+    if CALENDAR_SYNC_ENABLED:
+        asyncio.create_task(token_refresh_loop())
+
+
+def _event_body(title: str, dt_iso: str, reminder_minutes: int) -> dict:
+    start = datetime.fromisoformat(dt_iso)
+    end = start + timedelta(hours=1)
+    return {
+        "summary": title,
+        "start": {
+            "dateTime": start.isoformat(),
+            "timeZone": GOOGLE_CALENDAR_TIMEZONE,
+        },
+        "end": {
+            "dateTime": end.isoformat(),
+            "timeZone": GOOGLE_CALENDAR_TIMEZONE,
+        },
+        "reminders": {
+            "useDefault": False,
+            "overrides": [
+                {"method": "popup", "minutes": reminder_minutes},
+            ],
+        },
+    }
+
+
+def insert_request(service, title: str, dt_iso: str, reminder_minutes: int = 30):
+    """Build (but don't execute) a request creating a 1-hour event."""
+    body = _event_body(title, dt_iso, reminder_minutes)
+    return service.events().insert(calendarId="primary", body=body)
+
+
+def delete_request(service, event_id: str):
+    """Build (but don't execute) a request deleting an event."""
+    return service.events().delete(calendarId="primary", eventId=event_id)
+
+
+def new_batch(service, callback):
+    """Start a batch against the Calendar API's own batch endpoint."""
+    return service.new_batch_http_request(callback=callback)
+
+
+def execute_batch(batch):
+    """Send a batch as one HTTP round trip on this thread's client."""
+    batch.execute(http=_http())
 
 
 def create_event(title: str, dt_iso: str, reminder_minutes: int = 30) -> Optional[str]:
     """Create a 1-hour calendar event. Returns event ID or None on failure."""
-    service = _get_service()
+    service = get_service()
     if service is None:
         return None
 
     try:
-        start = datetime.fromisoformat(dt_iso)
-        end = start + timedelta(hours=1)
-
-        event = {
-            "summary": title,
-            "start": {
-                "dateTime": start.isoformat(),
-                "timeZone": GOOGLE_CALENDAR_TIMEZONE,
-            },
-            "end": {
-                "dateTime": end.isoformat(),
-                "timeZone": GOOGLE_CALENDAR_TIMEZONE,
-            },
-            "reminders": {
-                "useDefault": False,
-                "overrides": [
-                    {"method": "popup", "minutes": reminder_minutes},
-                ],
-            },
-        }
-
-        result = service.events().insert(calendarId="primary", body=event).execute()
+        result = insert_request(service, title, dt_iso, reminder_minutes).execute(http=_http())
         event_id = result["id"]
         logger.info("Created Google Calendar event %s for '%s'", event_id, title)
         return event_id
@@ -84,12 +216,12 @@ def create_event(title: str, dt_iso: str, reminder_minutes: int = 30) -> Optiona
 
 def delete_event(event_id: str) -> bool:
     """Delete a calendar event. Returns True on success, False on failure."""
-    service = _get_service()
+    service = get_service()
     if service is None:
         return False
 
     try:
-        service.events().delete(calendarId="primary", eventId=event_id).execute()
+        delete_request(service, event_id).execute(http=_http())
         logger.info("Deleted Google Calendar event %s", event_id)
         return True
     except Exception:
@@ -1,24 +1,175 @@
 import asyncio
+import functools
+import io
 import logging
-from datetime import datetime
+import time
+import weakref
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from telegram import Update
-from telegram.constants import ChatAction
+from telegram.constants import ChatAction, MessageLimit
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+import async_database
+import briefings
 import claude_client
-import database
-from briefings import _generate_briefing
-from voice import transcribe_voice, synthesize_speech
+import intents
+import metrics
+import profiling
+import speech_pipeline
+import summaries
+from config import (
+    APPOINTMENT_TIMEZONE,
+    EVENING_BRIEFING_HOUR,
+    MORNING_BRIEFING_HOUR,
+    OWNER_CHAT_ID,
+    PROFILE_DEFAULT_SECONDS,
+    PROFILE_MAX_SECONDS,
+    STREAM_REPLIES,
+    STREAM_EDIT_INTERVAL,
+)
+from voice import transcribe_voice
 
 logger = logging.getLogger(__name__)
 
+# Updates are processed concurrently; these keep turns within one chat in
+# arrival order while different chats proceed in parallel. Entries vanish
+# once no handler holds or waits on the lock.
+_chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _chat_lock(chat_id: int) -> asyncio.Lock:
+    lock = _chat_locks.get(chat_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _chat_locks[chat_id] = lock
+    return lock
+
+
+def _serialized_per_chat(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        async with _chat_lock(update.effective_chat.id):
+            return await handler(update, context)
+
+    return wrapper
+
+
+async def _send_voice(message, text: str):
+    try:
+        await speech_pipeline.speak(message.get_bot(), message.chat_id, text)
+    except Exception:
+        logger.exception("TTS failed")
+
 
 async def _send_reply(message, text: str):
-    await message.reply_text(text)
+    with metrics.span("telegram.send_text"):
+        await message.reply_text(text)
+    await _send_voice(message, text)
+
+
+class _StreamingReply:
+    """Shows a streamed reply as one Telegram message edited in place.
+
+    The first chunk of text is sent as soon as it arrives; later chunks are
+    folded in with edits at most every STREAM_EDIT_INTERVAL seconds.
+    """
+
+    def __init__(self, message):
+        self._message = message
+        self._sent = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._started = time.monotonic()
+        self.first_visible_ms = None
+
+    async def on_text(self, delta: str):
+        self._text += delta
+        if self._sent is None or time.monotonic() - self._last_edit >= STREAM_EDIT_INTERVAL:
+            try:
+                await self._flush()
+            except TelegramError:
+                # Best effort mid-stream (RetryAfter, timeouts, ...): the next
+                # flush or finish() catches up.
+                logger.warning("Failed to update streamed reply", exc_info=True)
+
+    async def finish(self, text: str):
+        limit = MessageLimit.MAX_TEXT_LENGTH
+        self._text = text[:limit]
+        try:
+            await self._flush()
+        except TelegramError:
+            if self._sent is None:
+                raise
+            logger.warning("Failed to edit in the final reply, sending it as a new message", exc_info=True)
+            with metrics.span("telegram.send_text"):
+                await self._message.reply_text(self._text.strip())
+        for start in range(limit, len(text), limit):
+            await self._message.reply_text(text[start:start + limit])
+
+    async def _flush(self):
+        text = self._text[:MessageLimit.MAX_TEXT_LENGTH].strip()
+        if not text or text == self._shown:
+            return
+        if self._sent is None:
+            with metrics.span("telegram.send_text"):
+                self._sent = await self._message.reply_text(text)
+            self.first_visible_ms = (time.monotonic() - self._started) * 1000
+            metrics.observe("ttft", self.first_visible_ms / 1000)
+            logger.info("Time to first visible text: %.0f ms", self.first_visible_ms)
+        else:
+            with metrics.span("telegram.edit_text"):
+                await self._sent.edit_text(text)
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+
+async def _respond(message, history: list[dict], chat_id: int, on_text, summary: Optional[str] = None) -> str:
+    """Get Claude's reply and show it as text, streaming when enabled.
+
+    on_text receives the reply text as it is produced (all at once when
+    streaming is off), so speech synthesis can start before it is done.
+    """
+    if not STREAM_REPLIES:
+        started = time.monotonic()
+        reply = await claude_client.get_response(history, chat_id, summary)
+        with metrics.span("telegram.send_text"):
+            await message.reply_text(reply)
+        metrics.observe("ttft", time.monotonic() - started)
+        logger.info("Time to first visible text: %.0f ms", (time.monotonic() - started) * 1000)
+        on_text(reply)
+        return reply
+
+    live = _StreamingReply(message)
+
+    async def on_delta(delta: str):
+        on_text(delta)
+        await live.on_text(delta)
+
+    reply = await claude_client.stream_response(history, chat_id, on_delta, summary)
+    await live.finish(reply)
+    return reply
+
+
+async def _converse(message, chat_id: int, user_text: str):
+    """Run one Claude turn, speaking the reply while it is being written."""
+    await async_database.store_message(chat_id, "user", user_text)
+    summary, history = await summaries.load_context(chat_id)
+
+    pipeline = speech_pipeline.SpeechPipeline()
+    voice_task = asyncio.create_task(pipeline.send(message.get_bot(), chat_id))
+    try:
+        reply = await _respond(message, history, chat_id, pipeline.feed, summary)
+    finally:
+        pipeline.close()
+
+    await async_database.store_message(chat_id, "assistant", reply)
+    summaries.compact_soon(chat_id)
     try:
-        audio_bytes = await synthesize_speech(text)
-        await message.reply_voice(audio_bytes)
+        await voice_task
     except Exception:
         logger.exception("TTS failed")
 
@@ -29,54 +180,46 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@_serialized_per_chat
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    database.clear_history(update.effective_chat.id)
+    await async_database.clear_history(update.effective_chat.id)
     await update.message.reply_text(
         "Very good, Sir. The slate has been wiped clean. A fresh start, as it were."
     )
 
 
-_TOMORROW_KEYWORDS = ["what's tomorrow", "whats tomorrow", "tomorrow's schedule", "tomorrows schedule"]
-_BRIEFING_KEYWORDS = [
-    "morning briefing", "what's my day", "whats my day", "daily briefing",
-    "briefing", "today's schedule", "todays schedule",
-]
-
-
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    user_text = update.message.text
-
-    text_lower = user_text.lower()
-    briefing_type = None
-    if any(kw in text_lower for kw in _TOMORROW_KEYWORDS):
-        briefing_type = "evening"
-    elif any(kw in text_lower for kw in _BRIEFING_KEYWORDS):
-        briefing_type = "morning"
-
-    if briefing_type:
-        database.store_message(chat_id, "user", user_text)
-        reply = await asyncio.to_thread(_generate_briefing, briefing_type, chat_id)
-        database.store_message(chat_id, "assistant", reply)
-        await _send_reply(update.message, reply)
+async def _handle_message(message, chat_id: int, user_text: str):
+    """Answer locally when the message is a known schedule request, else ask Claude."""
+    started = time.monotonic()
+    reply = await intents.respond(chat_id, user_text)
+    if reply is not None:
+        await async_database.store_message(chat_id, "user", user_text)
+        await async_database.store_message(chat_id, "assistant", reply)
+        summaries.compact_soon(chat_id)
+        await _send_reply(message, reply)
+        metrics.observe("turn.local", time.monotonic() - started)
         return
 
-    database.store_message(chat_id, "user", user_text)
-    history = database.get_history(chat_id)
+    await _converse(message, chat_id, user_text)
+    elapsed = time.monotonic() - started
+    metrics.observe("turn.claude", elapsed)
+    intents.record_claude_turn(elapsed)
 
-    reply = await asyncio.to_thread(claude_client.get_response, history, chat_id)
 
-    database.store_message(chat_id, "assistant", reply)
-    await _send_reply(update.message, reply)
+@_serialized_per_chat
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _handle_message(update.message, update.effective_chat.id, update.message.text)
 
 
+@_serialized_per_chat
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
 
     await update.message.chat.send_action(ChatAction.TYPING)
 
-    voice_file = await update.message.voice.get_file()
-    oga_bytes = await voice_file.download_as_bytearray()
+    with metrics.span("telegram.download_voice"):
+        voice_file = await update.message.voice.get_file()
+        oga_bytes = await voice_file.download_as_bytearray()
 
     try:
         transcription = await transcribe_voice(bytes(oga_bytes))
@@ -90,18 +233,12 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text(f'[I heard: "{transcription}"]')
 
-    database.store_message(chat_id, "user", transcription)
-    history = database.get_history(chat_id)
-
-    reply = await asyncio.to_thread(claude_client.get_response, history, chat_id)
-
-    database.store_message(chat_id, "assistant", reply)
-    await _send_reply(update.message, reply)
+    await _handle_message(update.message, chat_id, transcription)
 
 
 async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    appointments = database.list_appointments(chat_id)
+    appointments = await async_database.list_appointments(chat_id)
 
     if not appointments:
         await update.message.reply_text(
@@ -109,11 +246,94 @@ async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    lines = ["Your upcoming engagements, Sir:\n"]
-    for appt in appointments:
-        dt = datetime.fromisoformat(appt["datetime"])
-        lines.append(
-            f"  #{appt['id']} — {appt['title']}\n"
-            f"       {dt.strftime('%A, %B %d at %I:%M %p')}"
-        )
-    await update.message.reply_text("\n".join(lines))
+    await update.message.reply_text(intents.format_appointment_list(appointments))
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id != OWNER_CHAT_ID:
+        return
+    await update.message.reply_text(metrics.format_stats())
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id != OWNER_CHAT_ID:
+        return
+    try:
+        seconds = float(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [seconds]")
+        return
+    seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+
+    await update.message.reply_text(f"Profiling for {seconds:.0f} seconds, Sir.")
+    try:
+        stacks, samples = await asyncio.to_thread(profiling.profile, seconds)
+    except RuntimeError as e:
+        await update.message.reply_text(str(e))
+        return
+    await update.message.reply_document(
+        document=io.BytesIO(stacks.encode()),
+        filename=f"profile-{int(time.time())}.folded",
+        caption=f"{samples} samples over {seconds:.0f}s (collapsed stacks for flamegraph.pl or speedscope)",
+    )
+
+
+_BRIEFING_USAGE = (
+    "Usage:\n"
+    "  /briefing — show your briefing schedule\n"
+    "  /briefing <morning hour> <evening hour> [timezone] — e.g. /briefing 7 21 Europe/London\n"
+    "      (use - for an hour to skip that briefing)\n"
+    "  /briefing on — the default hours\n"
+    "  /briefing off"
+)
+
+
+def _format_briefing_schedule(schedule: Optional[dict]) -> str:
+    if schedule is None or (schedule["morning_hour"] is None and schedule["evening_hour"] is None):
+        return "You receive no briefings at present, Sir."
+    parts = [
+        f"{briefing_type} at {schedule[f'{briefing_type}_hour']:02d}:00"
+        for briefing_type in briefings.BRIEFING_TYPES
+        if schedule[f"{briefing_type}_hour"] is not None
+    ]
+    return f"Your briefings, Sir: {' and '.join(parts)} ({schedule['timezone']})."
+
+
+def _parse_hour(value: str) -> Optional[int]:
+    if value == "-":
+        return None
+    hour = int(value)
+    if not 0 <= hour <= 23:
+        raise ValueError(value)
+    return hour
+
+
+async def briefing_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    args = context.args or []
+    current = await async_database.get_briefing_schedule(chat_id)
+
+    if not args:
+        await update.message.reply_text(_format_briefing_schedule(current))
+        return
+
+    timezone = current["timezone"] if current else APPOINTMENT_TIMEZONE
+    if args == ["off"]:
+        await briefings.set_schedule(chat_id, timezone, None, None)
+        await update.message.reply_text("Very good, Sir. No more briefings until you say otherwise.")
+        return
+    if args == ["on"]:
+        args = [str(MORNING_BRIEFING_HOUR), str(EVENING_BRIEFING_HOUR)]
+
+    try:
+        if len(args) not in (2, 3):
+            raise ValueError(args)
+        morning_hour, evening_hour = _parse_hour(args[0]), _parse_hour(args[1])
+        if len(args) == 3:
+            timezone = ZoneInfo(args[2]).key
+    except (ValueError, ZoneInfoNotFoundError):
+        await update.message.reply_text(_BRIEFING_USAGE)
+        return
+
+    await briefings.set_schedule(chat_id, timezone, morning_hour, evening_hour)
+    await update.message.reply_text(_format_briefing_schedule(await async_database.get_briefing_schedule(chat_id)))
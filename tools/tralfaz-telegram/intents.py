@@ -0,0 +1,185 @@
+"""Local fast path for common schedule questions.
+
+Messages that consist of nothing but a known schedule question ("what's
+on tomorrow?", "next appointment", ...) are answered straight from the
+database with a template instead of a Claude round trip. All
+phrases are compiled into one regex and the whole message must match it;
+anything longer or unrecognized, or any reply to a question Claude just
+asked, is left to Claude. So are changes such as cancellations, which
+Claude confirms before making.
+"""
+
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Optional
+
+import async_database
+import briefings
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHATS = r"(?:what(?:'s|s| is| do i have)\s+)"
+_APPOINTMENTS = r"(?:appointments?|engagements?|schedule|calendar|agenda|plans)"
+
+_INTENT_PATTERNS = {
+    "briefing": r"(?:my\s+|the\s+)?(?:morning\s+|daily\s+)?briefing",
+    # A bare "today", "tomorrow" or "next" is more likely an answer to a
+    # question than a request, so each needs a question or a schedule noun.
+    "today": (
+        rf"{_WHATS}(?:on\s+)?(?:my\s+{_APPOINTMENTS}\s+)?(?:for\s+)?today"
+        rf"|(?:my\s+)?{_APPOINTMENTS}\s+(?:for\s+)?today"
+        rf"|today(?:'s|s)?\s+{_APPOINTMENTS}"
+        rf"|{_WHATS}my\s+day(?:\s+look(?:ing)?\s+like)?"
+    ),
+    "tomorrow": (
+        rf"{_WHATS}(?:on\s+)?(?:my\s+{_APPOINTMENTS}\s+)?(?:for\s+)?tomorrow"
+        rf"|(?:my\s+)?{_APPOINTMENTS}\s+(?:for\s+)?tomorrow"
+        rf"|tomorrow(?:'s|s)?\s+{_APPOINTMENTS}"
+    ),
+    "next": (
+        rf"{_WHATS}next"
+        rf"|(?:when(?:'s|s| is)\s+|what(?:'s|s| is)\s+)?my\s+next\s+(?:appointment|engagement|meeting)"
+        rf"|next\s+(?:appointment|engagement|meeting)"
+    ),
+    "list": (
+        rf"(?:list|show)\s+(?:me\s+)?(?:all\s+)?(?:my\s+)?(?:upcoming\s+)?{_APPOINTMENTS}"
+        rf"|(?:my\s+)?upcoming\s+{_APPOINTMENTS}"
+        rf"|{_WHATS}(?:on\s+)?my\s+{_APPOINTMENTS}"
+    ),
+}
+
+_PREFIX = r"(?:(?:ok|okay|so|hey|tralfaz|sir|please|can you|could you|would you|give me|tell me|show me)\s+)*"
+_SUFFIX = r"(?:\s+(?:please|sir|tralfaz|then))*"
+
+_INTENT_RE = re.compile(
+    rf"{_PREFIX}(?:"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _INTENT_PATTERNS.items())
+    + rf"){_SUFFIX}"
+)
+
+_stats: dict[str, dict] = {name: {"hits": 0, "local_ms": 0.0} for name in _INTENT_PATTERNS}
+_fallbacks = 0
+# Moving average of a full Claude turn, used to estimate time saved per hit.
+_claude_turn_ms: Optional[float] = None
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w'.\s]", " ", text)
+    text = re.sub(r"[.']+(\s|$)", r"\1", text)
+    return " ".join(text.split())
+
+
+def match(text: str) -> Optional[str]:
+    """Return the intent if the whole message is one known request."""
+    m = _INTENT_RE.fullmatch(_normalize(text))
+    if m is None:
+        return None
+    return next(name for name in _INTENT_PATTERNS if m.group(name) is not None)
+
+
+# --- Templates ---
+
+
+def _when(appt: dict, with_day: bool = True) -> str:
+    dt = datetime.fromisoformat(appt["datetime"])
+    return dt.strftime("%A, %B %d at %I:%M %p" if with_day else "%I:%M %p")
+
+
+def format_appointment_list(appointments: list[dict]) -> str:
+    lines = ["Your upcoming engagements, Sir:\n"]
+    for appt in appointments:
+        lines.append(
+            f"  #{appt['id']} — {appt['title']}\n"
+            f"       {_when(appt)}"
+        )
+    return "\n".join(lines)
+
+
+def _day_reply(appointments: list[dict], day: str) -> str:
+    if not appointments:
+        return f"Nothing whatsoever on the books for {day}, Sir. A rare luxury."
+    count = "one engagement" if len(appointments) == 1 else f"{len(appointments)} engagements"
+    lines = [f"You have {count} {day}, Sir:"]
+    for appt in appointments:
+        lines.append(f"  {_when(appt, with_day=False)} — {appt['title']} (#{appt['id']})")
+    return "\n".join(lines)
+
+
+async def _answer(intent: str, chat_id: int) -> str:
+    if intent == "briefing":
+        return await briefings.get_briefing("morning", chat_id)
+
+    if intent == "today":
+        return _day_reply(await async_database.get_todays_appointments(chat_id), "today")
+
+    if intent == "tomorrow":
+        return _day_reply(await async_database.get_tomorrows_appointments(chat_id), "tomorrow")
+
+    if intent == "next":
+        appointments = await async_database.list_appointments(chat_id)
+        if not appointments:
+            return "Your calendar is blissfully empty, Sir. A rare luxury."
+        appt = appointments[0]
+        return f"Next on the agenda, Sir: {appt['title']}, {_when(appt)} (#{appt['id']})."
+
+    if intent == "list":
+        appointments = await async_database.list_appointments(chat_id)
+        if not appointments:
+            return "Your calendar is blissfully empty, Sir. A rare luxury."
+        return format_appointment_list(appointments)
+
+    raise ValueError(f"Unknown intent: {intent}")
+
+
+async def respond(chat_id: int, text: str) -> Optional[str]:
+    """Answer text locally if it is a known request, else return None."""
+    global _fallbacks
+    intent = match(text)
+    # After a question from Claude ("When shall I book it?"), even a full
+    # match is most likely the answer, which only Claude has the context for.
+    if intent is not None:
+        last_reply = await async_database.get_last_assistant_message(chat_id)
+        if last_reply is not None and last_reply.rstrip().endswith("?"):
+            intent = None
+    if intent is None:
+        _fallbacks += 1
+        return None
+
+    started = time.perf_counter()
+    reply = await _answer(intent, chat_id)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _stats[intent]["hits"] += 1
+    _stats[intent]["local_ms"] += elapsed_ms
+    logger.info("Answered %s intent locally in %.1f ms", intent, elapsed_ms)
+    return reply
+
+
+def record_claude_turn(seconds: float):
+    """Feed the duration of a turn that went to Claude into the savings estimate."""
+    global _claude_turn_ms
+    ms = seconds * 1000
+    _claude_turn_ms = ms if _claude_turn_ms is None else 0.9 * _claude_turn_ms + 0.1 * ms
+
+
+def stats() -> dict:
+    hits = sum(entry["hits"] for entry in _stats.values())
+    total = hits + _fallbacks
+    intents = {}
+    for name, entry in _stats.items():
+        avg_ms = entry["local_ms"] / entry["hits"] if entry["hits"] else 0.0
+        saved = (_claude_turn_ms - avg_ms) * entry["hits"] if _claude_turn_ms is not None else None
+        intents[name] = {"hits": entry["hits"], "avg_local_ms": avg_ms, "est_saved_ms": saved}
+    return {
+        "hits": hits,
+        "fallbacks": _fallbacks,
+        "hit_rate": hits / total if total else 0.0,
+        "claude_turn_ms": _claude_turn_ms,
+        "intents": intents,
+    }
+
+
+metrics.register_gauges("intents", stats)
@@ -0,0 +1,231 @@
+"""In-process latency metrics.
+
+Code marks stages with metrics.span("name") (a context manager) or
+@metrics.timed("name") (for sync or async functions). Each stage feeds a
+histogram with fixed Prometheus buckets plus a bounded sample of recent
+durations for percentiles. Modules with their own counters register a
+stats function with register_gauges.
+
+The numbers are served two ways: the owner-only /stats command
+(format_stats) and a Prometheus text endpoint on localhost
+(start_metrics_server).
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from config import METRICS_HOST, METRICS_PORT, METRICS_SAMPLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent: deque[float] = deque(maxlen=METRICS_SAMPLE_SIZE)
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.recent)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+_histograms: dict[str, Histogram] = {}
+_lock = threading.Lock()
+_gauges: dict[str, Callable[[], dict]] = {}
+
+
+def observe(stage: str, seconds: float, error: bool = False):
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+        if error:
+            histogram.errors += 1
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as one observation of stage."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started, error)
+
+
+def timed(stage: str):
+    """Decorator form of span for plain and async functions."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def register_gauges(prefix: str, stats: Callable[[], dict]):
+    """Expose the numeric values of stats() (nested dicts flattened) as gauges."""
+    _gauges[prefix] = stats
+
+
+def _flatten(prefix: str, values: dict) -> dict[str, float]:
+    flat = {}
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def gauges() -> dict[str, float]:
+    flat = {}
+    for prefix, stats in list(_gauges.items()):
+        try:
+            flat.update(_flatten(prefix, stats()))
+        except Exception:
+            logger.exception("Stats callback %s failed", prefix)
+    return flat
+
+
+def snapshot() -> dict[str, dict]:
+    with _lock:
+        return {
+            stage: {
+                "count": histogram.count,
+                "errors": histogram.errors,
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "p99": histogram.percentile(99),
+            }
+            for stage, histogram in sorted(_histograms.items())
+        }
+
+
+# --- Output ---
+
+
+def format_stats() -> str:
+    lines = ["Stage latencies (ms), recent samples:", f"{'stage':<28}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}"]
+    for stage, row in snapshot().items():
+        errors = f"  ({row['errors']} err)" if row["errors"] else ""
+        lines.append(
+            f"{stage:<28}{row['count']:>6}{row['p50'] * 1000:>8.0f}"
+            f"{row['p95'] * 1000:>8.0f}{row['p99'] * 1000:>8.0f}{errors}"
+        )
+    values = gauges()
+    if values:
+        lines.append("")
+        for name, value in sorted(values.items()):
+            lines.append(f"{name} = {value:.3f}" if isinstance(value, float) else f"{name} = {value}")
+    return "\n".join(lines)
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP tralfaz_stage_seconds Time spent per processing stage.",
+        "# TYPE tralfaz_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'tralfaz_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'tralfaz_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'tralfaz_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append("# TYPE tralfaz_stage_errors_total counter")
+        for stage, histogram in sorted(_histograms.items()):
+            lines.append(f'tralfaz_stage_errors_total{{stage="{stage}"}} {histogram.errors}')
+    for name, value in sorted(gauges().items()):
+        lines.append(f"# TYPE tralfaz_{name} gauge")
+        lines.append(f"tralfaz_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render_prometheus().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_server: Optional[asyncio.AbstractServer] = None
+
+
+async def start_metrics_server(app):
+    global _server
+    if not METRICS_PORT:
+        return
+    try:
+        _server = await asyncio.start_server(_serve, METRICS_HOST, METRICS_PORT)
+    except OSError as exc:
+        # Optional endpoint; e.g. a port already in use mustn't stop the bot.
+        logger.warning("Metrics endpoint disabled: can't listen on %s:%s (%s)", METRICS_HOST, METRICS_PORT, exc)
+        _server = None
+        return
+    logger.info("Metrics at http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+
+
+async def stop_metrics_server():
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
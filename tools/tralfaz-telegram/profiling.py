@@ -0,0 +1,118 @@
+"""Event-loop lag watchdog and an on-demand sampling profiler.
+
+A loop task wakes every LOOP_LAG_INTERVAL seconds and records how late it
+was scheduled ("loop.lag" in metrics). A separate thread watches the task's
+heartbeat: once the loop has been silent for LOOP_LAG_THRESHOLD seconds it
+grabs the loop thread's stack while the blocking call is still running, so
+the warning logged afterwards names the culprit instead of just the delay.
+
+profile() samples every thread's stack for a while and returns the counts
+in collapsed-stack format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and similar tools read directly.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Optional
+
+import metrics
+from config import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD, PROFILE_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_heartbeat = time.monotonic()
+_loop_thread_id: Optional[int] = None
+# Stack of the loop thread captured by the watchdog during the current stall.
+_stalled_stack: Optional[str] = None
+_stats = {"stalls": 0, "max_lag_ms": 0.0}
+_profiling = threading.Lock()
+
+
+def _watchdog():
+    global _stalled_stack
+    reported = None
+    while True:
+        time.sleep(LOOP_LAG_THRESHOLD / 2)
+        beat = _heartbeat
+        if beat == reported or time.monotonic() - beat < LOOP_LAG_THRESHOLD:
+            continue
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is not None:
+            _stalled_stack = "".join(traceback.format_stack(frame))
+        reported = beat
+
+
+async def lag_monitor():
+    global _heartbeat, _stalled_stack
+    logger.info("Event-loop lag monitor started")
+    while True:
+        expected = time.monotonic() + LOOP_LAG_INTERVAL
+        _heartbeat = time.monotonic()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.monotonic() - expected)
+        _heartbeat = time.monotonic()
+        metrics.observe("loop.lag", lag)
+        _stats["max_lag_ms"] = max(_stats["max_lag_ms"], lag * 1000)
+        stack, _stalled_stack = _stalled_stack, None
+        if lag >= LOOP_LAG_THRESHOLD:
+            _stats["stalls"] += 1
+            logger.warning(
+                "Event loop blocked for %.0f ms; loop thread was in:\n%s",
+                lag * 1000, stack or "(stack not captured)",
+            )
+
+
+def stats() -> dict:
+    return dict(_stats)
+
+
+async def start_lag_monitor(app):
+    global _loop_thread_id
+    _loop_thread_id = threading.get_ident()
+    threading.Thread(target=_watchdog, name="loop-watchdog", daemon=True).start()
+    asyncio.create_task(lag_monitor())
+
+
+# --- Sampling profiler ---
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def profile(seconds: float) -> tuple[str, int]:
+    """Sample all threads for the given time. Blocking; returns (collapsed stacks, samples).
+
+    Run it off the event loop so the loop itself gets sampled.
+    """
+    if not _profiling.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        counts: Counter[str] = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != me:
+                    thread = "event-loop" if thread_id == _loop_thread_id else names.get(thread_id, str(thread_id))
+                    counts[f"{thread};{_collapse(frame)}"] += 1
+            samples += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+    finally:
+        _profiling.release()
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common()), samples
+
+
+metrics.register_gauges("loop", stats)
@@ -0,0 +1,68 @@
+"""Token buckets for outgoing Telegram sends.
+
+Telegram allows roughly TELEGRAM_GLOBAL_RATE messages per second per bot
+and about one per second per chat (short bursts are tolerated). Background
+senders (reminders, briefings) call acquire(chat_id) before each Telegram
+call, including every voice note (speech_pipeline.speak(paced=True)); it
+reserves a token from both the global and the chat's bucket and sleeps
+until the later of the two is available. Reservations are taken in call
+order, so waiting senders go out first come, first served.
+"""
+
+import asyncio
+import time
+
+import metrics
+from config import (
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_BURST,
+    TELEGRAM_GLOBAL_RATE,
+)
+
+# Idle per-chat buckets are dropped once there are more than this many.
+_MAX_CHAT_BUCKETS = 1024
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, going into debt if needed; returns seconds until it is really ours."""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+_global = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST)
+_chats: dict[int, TokenBucket] = {}
+
+
+def _chat_bucket(chat_id: int) -> TokenBucket:
+    bucket = _chats.get(chat_id)
+    if bucket is None:
+        if len(_chats) >= _MAX_CHAT_BUCKETS:
+            for idle_chat in [chat for chat, b in _chats.items() if b.idle()]:
+                del _chats[idle_chat]
+        bucket = _chats[chat_id] = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+    return bucket
+
+
+async def acquire(chat_id: int):
+    """Wait until one more message may be sent to chat_id."""
+    wait = max(_global.reserve(), _chat_bucket(chat_id).reserve())
+    if wait > 0:
+        metrics.observe("telegram.rate_wait", wait)
+        await asyncio.sleep(wait)
@@ -1,42 +1,198 @@
 import asyncio
+import heapq
 import logging
+import time
 from datetime import datetime
+from typing import Optional
 
-import database
-from config import REMINDER_CHECK_INTERVAL
-from voice import synthesize_speech
+import async_database
+import background
+import ratelimit
+import speech_pipeline
+from config import REMINDER_MAX_CONCURRENCY, REMINDER_PREFETCH_SECONDS, REMINDER_RESCAN_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+# Min-heap of (fire_time, appointment_id). _scheduled holds the current fire
+# time per appointment; heap entries that no longer match it are stale and
+# skipped, which is how cancellations and reschedules are handled.
+_heap: list[tuple[int, int]] = []
+# Same idea for voice prefetch: (prefetch_time, fire_time, appointment_id).
+_prefetch_heap: list[tuple[int, int, int]] = []
+_scheduled: dict[int, int] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_tasks: set[asyncio.Task] = set()
+# Reminders being sent right now; a rescan must not schedule them again.
+_delivering: set[int] = set()
+# Appointments scheduled or dropped while a rescan's query runs; their
+# in-memory state is newer than its snapshot.
+_touched_during_load: Optional[set[int]] = None
+
+
+def _push(appointment_id: int, fire_time: int):
+    if _touched_during_load is not None:
+        _touched_during_load.add(appointment_id)
+    if _scheduled.get(appointment_id) == fire_time:
+        return
+    _scheduled[appointment_id] = fire_time
+    heapq.heappush(_heap, (fire_time, appointment_id))
+    heapq.heappush(_prefetch_heap, (fire_time - REMINDER_PREFETCH_SECONDS, fire_time, appointment_id))
+    if _wakeup is not None and appointment_id in (_heap[0][1], _prefetch_heap[0][2]):
+        _wakeup.set()
+
+
+def _drop(appointment_id: int):
+    if _touched_during_load is not None:
+        _touched_during_load.add(appointment_id)
+    _scheduled.pop(appointment_id, None)
+
+
+def schedule(appointment_id: int, remind_at: Optional[int]):
+    """Add or move an appointment's reminder. Safe to call from any thread."""
+    if remind_at is None:
+        logger.warning("Can't schedule reminder for appointment %s", appointment_id)
+        return
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_push, appointment_id, remind_at)
+
+
+def unschedule(appointment_id: int):
+    """Forget an appointment's reminder. Safe to call from any thread."""
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_drop, appointment_id)
+
+
+async def _load():
+    global _heap, _prefetch_heap, _touched_during_load
+    _touched_during_load = set()
+    try:
+        appointments = await async_database.get_upcoming_reminders()
+    finally:
+        touched, _touched_during_load = _touched_during_load, None
+    snapshot = {appt["id"]: appt["remind_at"] for appt in appointments if appt["id"] not in _delivering}
+    for appt_id in touched:
+        snapshot.pop(appt_id, None)
+        if appt_id in _scheduled:
+            snapshot[appt_id] = _scheduled[appt_id]
+    _scheduled.clear()
+    _scheduled.update(snapshot)
+    _heap = [(fire_time, appt_id) for appt_id, fire_time in _scheduled.items()]
+    heapq.heapify(_heap)
+    # Re-prefetching a reminder that was already prefetched is only a cache hit.
+    _prefetch_heap = [
+        (fire_time - REMINDER_PREFETCH_SECONDS, fire_time, appt_id)
+        for appt_id, fire_time in _scheduled.items()
+    ]
+    heapq.heapify(_prefetch_heap)
+    logger.info("Loaded %d pending reminder(s)", len(_heap))
+
+
+def _pop_due(now: float) -> list[int]:
+    due = []
+    while _heap and _heap[0][0] <= now:
+        fire_time, appt_id = heapq.heappop(_heap)
+        if _scheduled.get(appt_id) == fire_time:
+            del _scheduled[appt_id]
+            due.append(appt_id)
+    return due
+
+
+def _pop_prefetch(now: float) -> list[int]:
+    due = []
+    while _prefetch_heap and _prefetch_heap[0][0] <= now:
+        _, fire_time, appt_id = heapq.heappop(_prefetch_heap)
+        if _scheduled.get(appt_id) == fire_time:
+            due.append(appt_id)
+    return due
+
+
+def _reminder_text(appt: dict) -> str:
+    dt = datetime.fromisoformat(appt["datetime"])
+    return (
+        f"Pardon the interruption, Sir. A gentle reminder: "
+        f'"{appt["title"]}" is coming up at {dt.strftime("%I:%M %p")}.'
+    )
+
+
+async def _send_reminder(app, appt: dict):
+    text = _reminder_text(appt)
+    # Usually a cache hit thanks to _prefetch; otherwise synthesize while the text goes out.
+    audio = asyncio.ensure_future(speech_pipeline.prefetch(text))
+    try:
+        await ratelimit.acquire(appt["chat_id"])
+        await app.bot.send_message(chat_id=appt["chat_id"], text=text)
+    except Exception:
+        logger.exception("Failed to send reminder for appointment %s", appt["id"])
+        audio.cancel()
+        return
+
+    try:
+        await audio
+        await speech_pipeline.speak(app.bot, appt["chat_id"], text, paced=True)
+    except Exception:
+        logger.exception("TTS failed for reminder %s", appt["id"])
+
+    await async_database.mark_reminded(appt["id"])
+
+
+async def _deliver(app, appt_id: int, fired_at: float):
+    try:
+        async with _semaphore:
+            # The heap only knows IDs; the row is the source of truth.
+            appt = await async_database.get_unreminded_appointment(appt_id)
+            if appt is None or appt["start_epoch"] < time.time():
+                return
+            await _send_reminder(app, appt)
+    finally:
+        _delivering.discard(appt_id)
+    logger.info("Reminder %s delivered %.2fs after its fire time", appt_id, time.time() - fired_at)
+
+
+async def _prefetch(appt_id: int):
+    async with _semaphore:
+        appt = await async_database.get_unreminded_appointment(appt_id)
+        if appt is not None:
+            await speech_pipeline.prefetch(_reminder_text(appt))
+
 
 async def reminder_loop(app):
     logger.info("Reminder background task started")
+    next_rescan = 0.0
     while True:
-        await asyncio.sleep(REMINDER_CHECK_INTERVAL)
         try:
-            due = database.get_due_reminders()
-            for appt in due:
-                dt = datetime.fromisoformat(appt["datetime"])
-                text = (
-                    f"Pardon the interruption, Sir. A gentle reminder: "
-                    f'"{appt["title"]}" is coming up at {dt.strftime("%I:%M %p")}.'
-                )
-                try:
-                    await app.bot.send_message(chat_id=appt["chat_id"], text=text)
-                except Exception:
-                    logger.exception("Failed to send reminder for appointment %s", appt["id"])
-                    continue
-
-                try:
-                    audio_bytes = await synthesize_speech(text)
-                    await app.bot.send_voice(chat_id=appt["chat_id"], voice=audio_bytes)
-                except Exception:
-                    logger.exception("TTS failed for reminder %s", appt["id"])
-
-                database.mark_reminded(appt["id"])
+            if time.monotonic() >= next_rescan:
+                # Safety net for rows written outside this process.
+                await _load()
+                next_rescan = time.monotonic() + REMINDER_RESCAN_INTERVAL
+
+            # Delivery runs concurrently (bounded by _semaphore, paced by
+            # ratelimit) so one slow chat doesn't hold up the rest of a batch.
+            now = time.time()
+            for appt_id in _pop_prefetch(now):
+                background.spawn(_tasks, _prefetch(appt_id), f"voice prefetch for reminder {appt_id}")
+            for appt_id in _pop_due(now):
+                _delivering.add(appt_id)
+                background.spawn(_tasks, _deliver(app, appt_id, now), f"reminder {appt_id}")
         except Exception:
             logger.exception("Error in reminder loop")
 
+        timeout = next_rescan - time.monotonic()
+        if _heap:
+            timeout = min(timeout, _heap[0][0] - time.time())
+        if _prefetch_heap:
+            timeout = min(timeout, _prefetch_heap[0][0] - time.time())
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
 
 async def start_reminders(app):
+    global _loop, _wakeup, _semaphore
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _semaphore = asyncio.Semaphore(REMINDER_MAX_CONCURRENCY)
     asyncio.create_task(reminder_loop(app))
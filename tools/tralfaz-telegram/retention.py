@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Message retention: archive old messages and reclaim database space.
+
+Messages older than MESSAGE_RETENTION_DAYS that are outside their chat's
+live window and already folded into its summary move to messages_archive
+with zlib-compressed content, in batches of RETENTION_BATCH_SIZE. The bot runs a pass every
+RETENTION_INTERVAL seconds followed by an incremental vacuum.
+
+Run directly for maintenance:
+
+    python retention.py stats     # database size and row counts
+    python retention.py run       # archive everything eligible now, then vacuum incrementally
+    python retention.py vacuum    # full VACUUM; also enables incremental auto-vacuum
+"""
+
+import asyncio
+import logging
+import sys
+
+import async_database
+import database
+from config import (
+    MESSAGE_RETENTION_DAYS,
+    RETENTION_BATCH_SIZE,
+    RETENTION_INTERVAL,
+    RETENTION_VACUUM_PAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def archive_all() -> int:
+    """Archive every eligible message. Blocking; returns the number moved."""
+    total = 0
+    last_id = 0
+    while True:
+        archived, last_id = database.archive_messages(MESSAGE_RETENTION_DAYS, RETENTION_BATCH_SIZE, last_id)
+        if not archived:
+            return total
+        total += archived
+
+
+async def run_once() -> int:
+    # One batch per DB-thread job, so chat queries queue behind at most one batch.
+    total = 0
+    last_id = 0
+    while True:
+        archived, last_id = await async_database.run(
+            database.archive_messages, MESSAGE_RETENTION_DAYS, RETENTION_BATCH_SIZE, last_id
+        )
+        if not archived:
+            break
+        total += archived
+    free_pages = await async_database.run(database.incremental_vacuum, RETENTION_VACUUM_PAGES)
+    if total:
+        logger.info("Archived %d message(s); %d free page(s) left after incremental vacuum", total, free_pages)
+    return total
+
+
+async def retention_loop():
+    logger.info("Retention background task started")
+    while True:
+        try:
+            await run_once()
+        except Exception:
+            logger.exception("Error in retention loop")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+async def start_retention(app):
+    asyncio.create_task(retention_loop())
+
+
+def _print_stats():
+    stats = database.database_stats()
+    mb = 1024 * 1024
+    print(f"Database file:     {stats['file_bytes'] / mb:.1f} MB (+ {stats['wal_bytes'] / mb:.1f} MB WAL)")
+    print(f"Free pages:        {stats['free_pages']} ({stats['free_bytes'] / mb:.1f} MB reclaimable)")
+    print(f"Auto-vacuum:       {stats['auto_vacuum']}")
+    print(f"Live messages:     {stats['messages']} ({stats['message_bytes'] / mb:.1f} MB text)")
+    print(f"Archived messages: {stats['archived_messages']} ({stats['archived_bytes'] / mb:.1f} MB compressed)")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    database.init_db()
+
+    if command == "stats":
+        _print_stats()
+    elif command == "run":
+        archived = archive_all()
+        free_pages = database.incremental_vacuum(RETENTION_VACUUM_PAGES)
+        print(f"Archived {archived} message(s); {free_pages} free page(s) left.\n")
+        _print_stats()
+    elif command == "vacuum":
+        database.vacuum()
+        print("Vacuumed.\n")
+        _print_stats()
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
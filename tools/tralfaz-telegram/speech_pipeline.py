@@ -0,0 +1,117 @@
+"""Sentence-pipelined speech for replies, briefings and reminders.
+
+Text is fed in as it is produced (streamed deltas or a finished reply),
+cut into sentence-aligned chunks of about TTS_CHUNK_CHARS, and each chunk
+is synthesized as soon as it is complete, with at most TTS_MAX_PARALLEL
+syntheses in flight. Chunks are sent as voice notes in order, or stitched
+into a single note when TTS_STITCH_SEGMENTS is set (Ogg Opus streams can
+be chained by concatenation).
+"""
+
+import asyncio
+import logging
+import re
+
+import tts_cache
+from config import TTS_MAX_PARALLEL, TTS_CHUNK_CHARS, TTS_STITCH_SEGMENTS
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\n\s*\n")
+
+
+def split_sentences(text: str) -> tuple[list[str], str]:
+    """Split text into complete sentences plus the unfinished remainder."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, text[start:]
+
+
+class SpeechPipeline:
+    def __init__(self, max_parallel: int = TTS_MAX_PARALLEL, chunk_chars: int = TTS_CHUNK_CHARS):
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._chunk_chars = chunk_chars
+        self._pending = ""
+        self._chunk = ""
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+
+    def feed(self, text: str):
+        if self._closed:
+            return
+        sentences, self._pending = split_sentences(self._pending + text)
+        for sentence in sentences:
+            self._chunk = f"{self._chunk} {sentence}".strip()
+            if len(self._chunk) >= self._chunk_chars:
+                self._submit()
+
+    def close(self):
+        if self._closed:
+            return
+        self._chunk = f"{self._chunk} {self._pending}".strip()
+        self._pending = ""
+        self._submit()
+        self._closed = True
+        self._queue.put_nowait(None)
+
+    def _submit(self):
+        chunk, self._chunk = self._chunk, ""
+        if chunk:
+            self._queue.put_nowait((chunk, asyncio.ensure_future(self._synthesize(chunk))))
+
+    async def _synthesize(self, chunk: str) -> bytes:
+        async with self._semaphore:
+            return await tts_cache.get_audio(chunk)
+
+    async def _segments(self):
+        while (item := await self._queue.get()) is not None:
+            yield item
+
+    async def send(self, bot, chat_id: int, stitch: bool = TTS_STITCH_SEGMENTS, paced: bool = False):
+        """Deliver the synthesized chunks to chat_id until close() is called.
+
+        paced rate-limits every voice note through ratelimit (see tts_cache.send_voice).
+        """
+        if stitch:
+            texts, audio = [], []
+            async for chunk, task in self._segments():
+                texts.append(chunk)
+                audio.append(await task)
+            if audio:
+                await tts_cache.send_voice(bot, chat_id, " ".join(texts), b"".join(audio), paced=paced)
+            return
+
+        async for chunk, task in self._segments():
+            try:
+                await tts_cache.send_voice(bot, chat_id, chunk, await task, paced=paced)
+            except Exception:
+                logger.exception("TTS failed for chunk of %d chars", len(chunk))
+
+    async def prefetch(self):
+        """Synthesize every chunk into the TTS cache without sending anything."""
+        async for chunk, task in self._segments():
+            try:
+                await task
+            except Exception:
+                logger.exception("TTS prefetch failed for chunk of %d chars", len(chunk))
+
+
+async def speak(bot, chat_id: int, text: str, paced: bool = False):
+    """Send an already complete text as pipelined voice notes."""
+    pipeline = SpeechPipeline()
+    pipeline.feed(text)
+    pipeline.close()
+    await pipeline.send(bot, chat_id, paced=paced)
+
+
+async def prefetch(text: str):
+    """Warm the TTS cache with the chunks speak() would send for text."""
+    pipeline = SpeechPipeline()
+    pipeline.feed(text)
+    pipeline.close()
+    await pipeline.prefetch()
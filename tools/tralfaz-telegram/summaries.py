@@ -0,0 +1,118 @@
+"""Rolling per-chat conversation summaries.
+
+Each chat keeps a stored summary in chat_summaries plus the id of the last
+message folded into it. Requests send that summary in the system prompt and
+only the messages after it. When those messages outgrow
+HISTORY_TOKEN_BUDGET, a background task folds the oldest of them into the
+summary until about HISTORY_COMPACT_TARGET tokens remain (so it doesn't
+run on every turn), keeping at least HISTORY_MIN_RECENT_MESSAGES verbatim.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import async_database
+import claude_client
+from config import (
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_COMPACT_TARGET,
+    HISTORY_MIN_RECENT_MESSAGES,
+    SUMMARY_PROMPT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing cost (role, separators) in tokens.
+_MESSAGE_OVERHEAD = 4
+
+_compacting: dict[int, asyncio.Task] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: about four characters per token for English."""
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(message["content"]) + _MESSAGE_OVERHEAD for message in messages)
+
+
+async def _claude_summarizer(previous: Optional[str], messages: list[dict]) -> str:
+    transcript = "\n".join(
+        f"{'Sir' if message['role'] == 'user' else 'Tralfaz'}: {message['content']}" for message in messages
+    )
+    content = f"Previous summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+    return await claude_client.get_response_with_system(SUMMARY_PROMPT, [{"role": "user", "content": content}])
+
+
+# (previous summary or None, messages to fold) -> new summary
+_summarizer: Callable[[Optional[str], list[dict]], Awaitable[str]] = _claude_summarizer
+
+
+def set_summarizer(summarizer: Callable[[Optional[str], list[dict]], Awaitable[str]]):
+    global _summarizer
+    _summarizer = summarizer
+
+
+def _split(messages: list[dict]) -> int:
+    """Index of the first message to keep verbatim; everything before it gets folded."""
+    keep = len(messages)
+    tokens = 0
+    while keep > 0:
+        cost = estimate_tokens(messages[keep - 1]["content"]) + _MESSAGE_OVERHEAD
+        if len(messages) - keep >= HISTORY_MIN_RECENT_MESSAGES and tokens + cost > HISTORY_COMPACT_TARGET:
+            break
+        tokens += cost
+        keep -= 1
+    # The kept window has to open with a user turn.
+    while keep < len(messages) and messages[keep]["role"] != "user":
+        keep += 1
+    return keep
+
+
+async def load_context(chat_id: int) -> tuple[Optional[str], list[dict]]:
+    """Return (summary, recent messages) to send with the next request."""
+    summary = await async_database.get_chat_summary(chat_id)
+    history = await async_database.get_history(chat_id)
+    return (summary["summary"] if summary else None), history
+
+
+async def compact(chat_id: int) -> bool:
+    """Fold messages beyond the token budget into the summary. Returns True if it did."""
+    current = await async_database.get_chat_summary(chat_id)
+    previous, after_id = (current["summary"], current["last_message_id"]) if current else (None, 0)
+    messages = await async_database.get_unsummarized_messages(chat_id, after_id)
+    if estimate_message_tokens(messages) <= HISTORY_TOKEN_BUDGET:
+        return False
+    keep = _split(messages)
+    if keep == 0:
+        return False
+
+    folded = messages[:keep]
+    # Runs outside the chat's lock so turns don't wait on the summarizer;
+    # save_chat_summary refuses the result if /clear ran in the meantime.
+    summary = await _summarizer(previous, folded)
+    saved = await async_database.save_chat_summary(chat_id, summary, folded[-1]["id"], after_id)
+    if saved:
+        logger.info(
+            "Compacted %d message(s) of chat %s into a %d-token summary",
+            len(folded), chat_id, estimate_tokens(summary),
+        )
+    return saved
+
+
+async def _compact_logged(chat_id: int):
+    try:
+        await compact(chat_id)
+    except Exception:
+        logger.exception("History compaction failed for chat %s", chat_id)
+
+
+def compact_soon(chat_id: int):
+    """Start a background compaction for the chat unless one is already running."""
+    if chat_id in _compacting:
+        return
+    task = asyncio.create_task(_compact_logged(chat_id))
+    _compacting[chat_id] = task
+    task.add_done_callback(lambda _: _compacting.pop(chat_id, None))
@@ -1,51 +1,34 @@
 #!/usr/bin/env python3
 """One-time script to sync existing future appointments to Google Calendar.
 
-Finds all future appointments with no google_event_id and creates
-Google Calendar events for them.
+Queues a calendar create for every future appointment with no
+google_event_id, then drains the whole outbox (including anything left
+over from the bot) in batched requests.
 """
 
-import sqlite3
-
+import calendar_sync
 import database
-import google_calendar
-from config import DB_PATH
 
 
 def main():
     database.init_db()
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        """
-        SELECT id, title, datetime, reminder_minutes_before
-        FROM appointments
-        WHERE google_event_id IS NULL
-          AND datetime >= datetime('now', 'localtime')
-        ORDER BY datetime ASC
-        """
-    ).fetchall()
-    conn.close()
-
-    if not rows:
+    queued = database.enqueue_unsynced_appointments()
+    pending = database.get_pending_outbox(limit=-1, include_deferred=True)
+
+    if not pending:
         print("No appointments to sync.")
         return
 
-    print(f"Found {len(rows)} appointment(s) to sync:\n")
-    for row in rows:
-        row = dict(row)
-        print(f"  [{row['id']}] {row['title']} — {row['datetime']}")
-        event_id = google_calendar.create_event(
-            row["title"], row["datetime"], row["reminder_minutes_before"]
-        )
-        if event_id:
-            database.set_google_event_id(row["id"], event_id)
-            print(f"       -> synced (event {event_id})")
+    print(f"Queued {queued} appointment(s); {len(pending)} calendar operation(s) pending:\n")
+    for row in pending:
+        if row["op"] == "create":
+            print(f"  create [{row['appointment_id']}] {row['title']} — {row['datetime']}")
         else:
-            print("       -> FAILED to sync")
+            print(f"  delete event {row['google_event_id']}")
 
-    print("\nDone.")
+    counts = calendar_sync.drain(include_deferred=True)
+    print(f"\nDone. {counts['synced']} synced, {counts['failed']} failed.")
 
 
 if __name__ == "__main__":
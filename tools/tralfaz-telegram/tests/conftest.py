@@ -0,0 +1,23 @@
+"""Shared fixtures. Like bench/_setup.py: bot modules on sys.path, dummy API keys, temp DBs."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for _var in ("TELEGRAM_BOT_TOKEN", "ANTHROPIC_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_var, "test")
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point database.py at a fresh temp DB with the schema created."""
+    import database
+
+    database.close_connections()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.init_db()
+    yield database
+    database.close_connections()
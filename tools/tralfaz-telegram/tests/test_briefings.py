@@ -0,0 +1,59 @@
+import asyncio
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import async_database
+import briefings
+import claude_client
+
+CHAT_ID = 4242
+DAY = date(2026, 3, 10)
+
+
+@pytest.fixture
+def rendered(db, monkeypatch):
+    """Capture the appointments text each briefing render is given."""
+    prompts = []
+
+    async def render(system, messages):
+        prompts.append(system)
+        return "Good morning, Sir."
+
+    monkeypatch.setattr(claude_client, "get_response_with_system", render)
+    monkeypatch.setattr(briefings, "_cache", {})
+    monkeypatch.setattr(briefings, "_schedules", {})
+    db.set_briefing_schedule(CHAT_ID, "Europe/London", 7, 21)
+    briefings._schedules[CHAT_ID] = db.get_briefing_schedule(CHAT_ID)
+    return prompts
+
+
+def test_briefing_in_another_timezone_uses_appointment_times(db, rendered):
+    # Appointment times are in APPOINTMENT_TIMEZONE, as /schedule shows them.
+    db.save_appointment(CHAT_ID, "Tea with the Duchess", "2026-03-10T15:00:00")
+    db.save_appointment(CHAT_ID, "Late supper", "2026-03-10T23:30:00")
+    db.save_appointment(CHAT_ID, "Tomorrow's fitting", "2026-03-11T09:00:00")
+
+    asyncio.run(briefings.get_briefing("morning", CHAT_ID, DAY))
+
+    (prompt,) = rendered
+    assert "Tea with the Duchess at 03:00 PM" in prompt
+    assert "Late supper at 11:30 PM" in prompt
+    assert "Tomorrow's fitting" not in prompt
+
+
+def test_failed_claim_still_schedules_the_next_briefing(db, rendered, monkeypatch):
+    async def claim(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(async_database, "claim_briefing", claim)
+    monkeypatch.setattr(briefings, "_next_fire", {})
+    monkeypatch.setattr(briefings, "_heap", [])
+    monkeypatch.setattr(briefings, "_precompute_heap", [])
+    fire_time = datetime(2026, 3, 10, 7, tzinfo=ZoneInfo("Europe/London")).timestamp()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(briefings._deliver(None, CHAT_ID, "morning", fire_time))
+
+    assert briefings._next_fire[(CHAT_ID, "morning")] > fire_time
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import claude_client
+
+DELTAS = ["Very ", "good, ", "Sir. ", "It shall ", "be done."]
+
+
+class FakeStream:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        for text in DELTAS:
+            await asyncio.sleep(0.001)
+            yield text
+
+    async def get_final_message(self):
+        usage = SimpleNamespace(input_tokens=10, output_tokens=5)
+        return SimpleNamespace(stop_reason="end_turn", content=[], usage=usage)
+
+
+def test_stream_releases_the_semaphore_before_slow_callbacks_finish(monkeypatch):
+    client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: FakeStream()))
+    monkeypatch.setattr(claude_client, "_client", client)
+    received = []
+
+    async def slow_edit(text):
+        await asyncio.sleep(0.05)
+        received.append(text)
+
+    async def main():
+        monkeypatch.setattr(claude_client, "_semaphore", asyncio.Semaphore(1))
+        streaming = asyncio.create_task(claude_client.stream_response([], 4242, slow_edit))
+        await asyncio.sleep(0.01)
+        async with claude_client._semaphore:
+            freed_with = len(received)
+        return await streaming, freed_with
+
+    started = time.perf_counter()
+    reply, freed_with = asyncio.run(main())
+    assert reply == "".join(DELTAS)
+    assert received == DELTAS
+    # Another request got the slot while the edits were still going.
+    assert freed_with < len(DELTAS)
+    assert time.perf_counter() - started >= 0.05 * len(DELTAS)
+
+
+def test_save_appointment_tool_rejects_an_unparseable_datetime(db):
+    result = claude_client._dispatch_tool("save_appointment", {"title": "Fitting", "datetime": "Thursday at 3"}, 4242)
+    assert json.loads(result) == {"error": "unrecognised datetime, use ISO 8601"}
+    assert db.get_connection().execute("SELECT COUNT(*) FROM appointments WHERE title = 'Fitting'").fetchone()[0] == 0
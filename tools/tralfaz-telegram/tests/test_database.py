@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+
+def test_new_database_uses_incremental_auto_vacuum(db):
+    conn = db.get_connection()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_existing_database_switches_to_incremental_auto_vacuum(db, tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE legacy (id INTEGER)")
+    conn.close()
+
+    db.close_connections()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    assert db.get_connection().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_appointment_changes_skip_the_outbox_without_calendar_sync(db, monkeypatch):
+    def outbox_rows():
+        return db.get_connection().execute("SELECT COUNT(*) FROM calendar_outbox").fetchone()[0]
+
+    monkeypatch.setattr(db, "CALENDAR_SYNC_ENABLED", False)
+    appointment_id = db.save_appointment(4242, "Fitting", "2030-01-03T15:00:00")
+    db.set_google_event_id(appointment_id, "event-1")
+    assert db.cancel_appointment(4242, appointment_id)
+    assert outbox_rows() == 0
+
+    monkeypatch.setattr(db, "CALENDAR_SYNC_ENABLED", True)
+    db.save_appointment(4242, "Fitting", "2030-01-03T15:00:00")
+    assert outbox_rows() == 1
+
+
+def test_unparseable_appointment_datetime_is_rejected(db, monkeypatch):
+    monkeypatch.setattr(db, "CALENDAR_SYNC_ENABLED", True)
+    conn = db.get_connection()
+    queued = conn.execute("SELECT COUNT(*) FROM calendar_outbox").fetchone()[0]
+
+    with pytest.raises(ValueError):
+        db.save_appointment(4242, "Fitting", "next Thursday-ish")
+
+    assert conn.execute("SELECT COUNT(*) FROM appointments WHERE title = 'Fitting'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM calendar_outbox").fetchone()[0] == queued
+
+
+def _old_messages(db, chat_id: int, count: int) -> list[int]:
+    for i in range(count):
+        db.store_message(chat_id, "user" if i % 2 == 0 else "assistant", f"message {i}")
+    conn = db.get_connection()
+    with conn:
+        conn.execute("UPDATE messages SET timestamp = datetime('now', '-90 days') WHERE chat_id = ?", (chat_id,))
+    return [row[0] for row in conn.execute("SELECT id FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,))]
+
+
+def _archive_all(db):
+    after_id = 0
+    while True:
+        archived, after_id = db.archive_messages(30, 1000, after_id)
+        if not archived:
+            break
+    return [row[0] for row in db.get_connection().execute("SELECT id FROM messages_archive ORDER BY id")]
+
+
+def test_archive_keeps_unsummarized_messages_outside_the_window(db):
+    ids = _old_messages(db, 4242, db.MAX_HISTORY_MESSAGES * 2)
+    # Compaction has only folded the first 10; the next 10 have scrolled out
+    # of the live window without being summarized.
+    assert db.save_chat_summary(4242, "Early days.", ids[9], 0)
+
+    assert _archive_all(db) == ids[:10]
+
+
+def test_archive_keeps_the_live_window_even_when_summarized(db):
+    ids = _old_messages(db, 4242, db.MAX_HISTORY_MESSAGES * 2)
+    assert db.save_chat_summary(4242, "Nearly everything.", ids[-5], 0)
+
+    assert _archive_all(db) == ids[:-db.MAX_HISTORY_MESSAGES]
+
+
+def test_archive_leaves_chats_without_a_summary_alone(db):
+    _old_messages(db, 4242, db.MAX_HISTORY_MESSAGES * 2)
+
+    assert _archive_all(db) == []
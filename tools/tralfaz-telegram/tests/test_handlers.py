@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from telegram.error import NetworkError, TimedOut
+
+import handlers
+
+
+class FlakyMessage:
+    """A chat message whose edits fail with the given errors, in turn."""
+
+    def __init__(self, edit_errors: list):
+        self.edit_errors = edit_errors
+        self.sent = []
+        self.edits = []
+
+    async def reply_text(self, text):
+        self.sent.append(text)
+        return self
+
+    async def edit_text(self, text):
+        if self.edit_errors:
+            raise self.edit_errors.pop(0)
+        self.edits.append(text)
+
+
+@pytest.fixture(autouse=True)
+def edit_every_delta(monkeypatch):
+    monkeypatch.setattr(handlers, "STREAM_EDIT_INTERVAL", 0)
+
+
+def test_failed_mid_stream_edits_dont_abort_the_reply():
+    message = FlakyMessage([TimedOut(), NetworkError("reset")])
+    live = handlers._StreamingReply(message)
+
+    async def stream():
+        for delta in ["Very ", "good, ", "Sir."]:
+            await live.on_text(delta)
+        await live.finish("Very good, Sir.")
+
+    asyncio.run(stream())
+    assert message.sent == ["Very"]
+    assert message.edits == ["Very good, Sir."]
+
+
+def test_failed_final_edit_sends_the_reply_anew():
+    message = FlakyMessage([])
+    live = handlers._StreamingReply(message)
+
+    async def stream():
+        await live.on_text("Very ")
+        message.edit_errors.append(NetworkError("reset"))
+        await live.finish("Very good, Sir.")
+
+    asyncio.run(stream())
+    assert message.sent == ["Very", "Very good, Sir."]
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import intents
+
+CHAT_ID = 4242
+
+
+@pytest.mark.parametrize(
+    "text, intent",
+    [
+        ("What's on tomorrow?", "tomorrow"),
+        ("my schedule today", "today"),
+        ("Schedule for tomorrow, please", "tomorrow"),
+        ("today's appointments", "today"),
+        ("what do I have today", "today"),
+        ("What's next?", "next"),
+        ("next appointment", "next"),
+        ("show me my upcoming engagements", "list"),
+        ("morning briefing", "briefing"),
+    ],
+)
+def test_schedule_questions_match(text, intent):
+    assert intents.match(text) == intent
+
+
+@pytest.mark.parametrize("text", ["today", "Tomorrow.", "next", "ok so next", "tomorrow please", "for today"])
+def test_bare_answers_go_to_claude(text):
+    assert intents.match(text) is None
+
+
+def test_reply_to_a_question_goes_to_claude(db):
+    db.store_message(CHAT_ID, "user", "Book a fitting with the tailor")
+    db.store_message(CHAT_ID, "assistant", "Certainly, Sir. When shall I book it?")
+    assert asyncio.run(intents.respond(CHAT_ID, "what's on tomorrow")) is None
+
+    db.store_message(CHAT_ID, "assistant", "Done, Sir.")
+    assert asyncio.run(intents.respond(CHAT_ID, "what's on tomorrow")).startswith("Nothing whatsoever")
+
+
+@pytest.mark.parametrize("text", ["delete 5", "cancel #12", "remove appointment 2 please"])
+def test_cancellations_go_to_claude(text):
+    assert intents.match(text) is None
@@ -0,0 +1,16 @@
+import asyncio
+import socket
+
+import metrics
+
+
+def test_metrics_server_port_in_use_is_not_fatal(monkeypatch):
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        monkeypatch.setattr(metrics, "METRICS_HOST", "127.0.0.1")
+        monkeypatch.setattr(metrics, "METRICS_PORT", taken.getsockname()[1])
+
+        asyncio.run(metrics.start_metrics_server(None))
+
+    assert metrics._server is None
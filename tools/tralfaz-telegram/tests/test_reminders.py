@@ -0,0 +1,24 @@
+import asyncio
+
+import async_database
+import reminders
+
+
+def test_rescan_keeps_changes_made_while_it_was_querying(monkeypatch):
+    monkeypatch.setattr(reminders, "_scheduled", {})
+    monkeypatch.setattr(reminders, "_heap", [])
+    monkeypatch.setattr(reminders, "_prefetch_heap", [])
+    reminders._push(1, 1000)
+    reminders._push(2, 2000)
+
+    async def upcoming():
+        # schedule() and unschedule() calls land while the query runs.
+        reminders._push(3, 1500)
+        reminders._drop(2)
+        return [{"id": 1, "remind_at": 1000}, {"id": 2, "remind_at": 2000}, {"id": 4, "remind_at": 4000}]
+
+    monkeypatch.setattr(async_database, "get_upcoming_reminders", upcoming)
+    asyncio.run(reminders._load())
+
+    assert reminders._scheduled == {1: 1000, 3: 1500, 4: 4000}
+    assert reminders._pop_due(5000) == [1, 3, 4]
@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+import ratelimit
+import speech_pipeline
+import tts_cache
+
+CHAT_ID = 4242
+
+
+class RecordingBot:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    async def send_voice(self, chat_id, voice, **kwargs):
+        self.calls.append(("send_voice", chat_id))
+        return SimpleNamespace(voice=None)
+
+
+def test_paced_speech_takes_a_token_per_voice_note(db, monkeypatch):
+    calls = []
+
+    async def acquire(chat_id):
+        calls.append(("acquire", chat_id))
+
+    async def get_audio(text):
+        return b"OggS"
+
+    monkeypatch.setattr(ratelimit, "acquire", acquire)
+    monkeypatch.setattr(tts_cache, "get_audio", get_audio)
+    text = " ".join(f"Sentence number {i} is here, Sir, and goes on for a while." for i in range(20))
+
+    asyncio.run(speech_pipeline.speak(RecordingBot(calls), CHAT_ID, text, paced=True))
+
+    sends = calls.count(("send_voice", CHAT_ID))
+    assert sends > 1
+    assert calls == [("acquire", CHAT_ID), ("send_voice", CHAT_ID)] * sends
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+import summaries
+
+CHAT_ID = 4242
+
+
+@pytest.fixture
+def long_history(db):
+    for i in range(20):
+        db.store_message(CHAT_ID, "user" if i % 2 == 0 else "assistant", f"message {i} " + "x" * 600)
+
+
+def test_compaction_folds_old_messages(db, long_history, monkeypatch):
+    async def summarize(previous, messages):
+        return "Sir discussed many things."
+
+    monkeypatch.setattr(summaries, "_summarizer", summarize)
+    assert asyncio.run(summaries.compact(CHAT_ID))
+    assert db.get_chat_summary(CHAT_ID)["summary"] == "Sir discussed many things."
+
+
+def test_clear_during_first_compaction_discards_the_summary(db, long_history, monkeypatch):
+    async def summarize(previous, messages):
+        db.clear_history(CHAT_ID)
+        return "What Sir asked to forget."
+
+    monkeypatch.setattr(summaries, "_summarizer", summarize)
+    assert not asyncio.run(summaries.compact(CHAT_ID))
+    assert db.get_chat_summary(CHAT_ID) is None
@@ -0,0 +1,12 @@
+import tts_cache
+
+
+def test_rewriting_a_clip_on_disk_counts_it_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tts_cache, "_disk_bytes", None)
+
+    tts_cache._disk_put("clip", b"x" * 1000)
+    tts_cache._disk_put("clip", b"x" * 1200)
+    tts_cache._disk_put("other", b"x" * 300)
+
+    assert tts_cache._disk_bytes == 1500
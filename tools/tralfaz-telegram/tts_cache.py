@@ -0,0 +1,234 @@
+"""Content-addressed cache in front of voice.synthesize_speech.
+
+Audio is keyed on a hash of (model, voice, format, normalized text) and
+kept in two LRU tiers: a small in-memory hot tier and a size-capped
+directory of opus blobs on disk. Once a clip has been uploaded, the
+Telegram file_id is remembered so later sends reuse it instead of
+uploading the bytes again.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from telegram.error import BadRequest
+
+import async_database
+import metrics
+import ratelimit
+from config import (
+    TTS_MODEL,
+    TTS_VOICE,
+    TTS_FORMAT,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MAX_BYTES,
+    TTS_MEMORY_CACHE_MAX_BYTES,
+)
+from voice import synthesize_speech
+
+logger = logging.getLogger(__name__)
+
+_memory: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_bytes = 0
+_disk_bytes: Optional[int] = None
+_disk_lock = threading.Lock()
+_inflight: dict[str, asyncio.Task] = {}
+
+_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "file_id_hits": 0,
+    "uploads": 0,
+}
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL, fmt: str = TTS_FORMAT) -> str:
+    payload = "\0".join((model, voice, fmt, normalize(text)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stats() -> dict:
+    lookups = _stats["memory_hits"] + _stats["disk_hits"] + _stats["misses"]
+    hits = _stats["memory_hits"] + _stats["disk_hits"]
+    return {
+        **_stats,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "memory_bytes": _memory_bytes,
+        "disk_bytes": _disk_bytes or 0,
+    }
+
+
+# --- Memory tier ---
+
+
+def _memory_get(key: str) -> Optional[bytes]:
+    audio = _memory.get(key)
+    if audio is not None:
+        _memory.move_to_end(key)
+    return audio
+
+
+def _memory_put(key: str, audio: bytes):
+    global _memory_bytes
+    if len(audio) > TTS_MEMORY_CACHE_MAX_BYTES:
+        return
+    old = _memory.pop(key, None)
+    if old is not None:
+        _memory_bytes -= len(old)
+    _memory[key] = audio
+    _memory_bytes += len(audio)
+    while _memory_bytes > TTS_MEMORY_CACHE_MAX_BYTES:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+# --- Disk tier (runs in worker threads) ---
+
+
+def _disk_path(key: str) -> str:
+    return os.path.join(TTS_CACHE_DIR, f"{key}.{TTS_FORMAT}")
+
+
+def _scan_disk() -> list[os.DirEntry]:
+    suffix = f".{TTS_FORMAT}"
+    try:
+        return [
+            entry for entry in os.scandir(TTS_CACHE_DIR)
+            if entry.is_file() and entry.name.endswith(suffix)
+        ]
+    except FileNotFoundError:
+        return []
+
+
+def _disk_get(key: str) -> Optional[bytes]:
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            audio = f.read()
+    except FileNotFoundError:
+        return None
+    # mtime doubles as the LRU clock for eviction.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return audio
+
+
+def _disk_put(key: str, audio: bytes):
+    global _disk_bytes
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    path = _disk_path(key)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(audio)
+    with _disk_lock:
+        if _disk_bytes is None:
+            _disk_bytes = sum(entry.stat().st_size for entry in _scan_disk())
+        # Another process (or a synthesis whose inflight entry was already
+        # dropped) may have written this clip; don't count it twice.
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        _disk_bytes += len(audio) - replaced
+        if _disk_bytes > TTS_CACHE_MAX_BYTES:
+            _evict_disk()
+
+
+def _evict_disk():
+    global _disk_bytes
+    entries = sorted(_scan_disk(), key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    target = TTS_CACHE_MAX_BYTES * 0.9
+    for entry in entries:
+        if total <= target:
+            break
+        size = entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            continue
+        total -= size
+    _disk_bytes = total
+
+
+# --- Public API ---
+
+
+async def _synthesize_and_store(key: str, text: str) -> bytes:
+    audio = await synthesize_speech(normalize(text))
+    _memory_put(key, audio)
+    try:
+        await asyncio.to_thread(_disk_put, key, audio)
+    except OSError:
+        logger.exception("Failed to write TTS cache entry %s", key)
+    return audio
+
+
+async def get_audio(text: str) -> bytes:
+    """Return opus audio for text, synthesizing only on a cache miss."""
+    key = cache_key(text)
+    audio = _memory_get(key)
+    if audio is not None:
+        _stats["memory_hits"] += 1
+        return audio
+
+    audio = await asyncio.to_thread(_disk_get, key)
+    if audio is not None:
+        _stats["disk_hits"] += 1
+        _memory_put(key, audio)
+        return audio
+
+    # Concurrent requests for the same clip share a single synthesis.
+    task = _inflight.get(key)
+    if task is None:
+        _stats["misses"] += 1
+        task = asyncio.ensure_future(_synthesize_and_store(key, text))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def send_voice(bot, chat_id: int, text: str, audio: Optional[bytes] = None, paced: bool = False):
+    """Send text as a voice note, reusing a known Telegram file_id if possible.
+
+    paced takes a ratelimit token before each Telegram call, for background senders.
+    """
+    key = cache_key(text)
+    file_id = await async_database.get_voice_file_id(key)
+    if file_id:
+        try:
+            if paced:
+                await ratelimit.acquire(chat_id)
+            with metrics.span("telegram.send_voice"):
+                message = await bot.send_voice(chat_id=chat_id, voice=file_id)
+            _stats["file_id_hits"] += 1
+            return message
+        except BadRequest:
+            logger.warning("Cached voice file_id for %s was rejected, re-uploading", key)
+            await async_database.delete_voice_file_id(key)
+
+    if audio is None:
+        audio = await get_audio(text)
+    if paced:
+        await ratelimit.acquire(chat_id)
+    with metrics.span("telegram.upload_voice"):
+        message = await bot.send_voice(chat_id=chat_id, voice=audio)
+    _stats["uploads"] += 1
+    if message.voice:
+        await async_database.set_voice_file_id(key, message.voice.file_id)
+    return message
+
+
+metrics.register_gauges("tts_cache", stats)
@@ -1,36 +1,88 @@
+from typing import Optional
+
 import httpx
-from config import OPENAI_API_KEY
+
+import metrics
+from config import (
+    OPENAI_API_KEY,
+    VOICE_HTTP_MAX_CONNECTIONS,
+    VOICE_HTTP_MAX_KEEPALIVE,
+    VOICE_HTTP_KEEPALIVE_EXPIRY,
+    VOICE_HTTP_CONNECT_TIMEOUT,
+    WHISPER_TIMEOUT,
+    TTS_TIMEOUT,
+    TTS_MODEL,
+    TTS_VOICE,
+    TTS_FORMAT,
+)
+
+try:
+    import h2  # noqa: F401
+
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
 TTS_URL = "https://api.openai.com/v1/audio/speech"
 
+# One pooled client for every Whisper/TTS call, so voice notes and spoken
+# replies reuse warm TCP/TLS connections instead of handshaking each time.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _new_client(**overrides) -> httpx.AsyncClient:
+    options = dict(
+        http2=_HTTP2,
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        limits=httpx.Limits(
+            max_connections=VOICE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=VOICE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=VOICE_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(TTS_TIMEOUT, connect=VOICE_HTTP_CONNECT_TIMEOUT),
+    )
+    options.update(overrides)
+    return httpx.AsyncClient(**options)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+
+async def close():
+    """Close the shared client. Called from the application shutdown hook."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
+@metrics.timed("whisper")
 async def transcribe_voice(oga_bytes: bytes) -> str:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            WHISPER_URL,
-            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-            files={"file": ("voice.oga", oga_bytes, "audio/ogg")},
-            data={"model": "whisper-1"},
-        )
-        response.raise_for_status()
-        return response.json()["text"]
+    response = await _get_client().post(
+        WHISPER_URL,
+        files={"file": ("voice.oga", oga_bytes, "audio/ogg")},
+        data={"model": "whisper-1"},
+        timeout=httpx.Timeout(WHISPER_TIMEOUT, connect=VOICE_HTTP_CONNECT_TIMEOUT),
+    )
+    response.raise_for_status()
+    return response.json()["text"]
 
 
+@metrics.timed("tts.synthesize")
 async def synthesize_speech(text: str) -> bytes:
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            TTS_URL,
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "tts-1",
-                "input": text,
-                "voice": "nova",
-                "response_format": "opus",
-            },
-        )
-        response.raise_for_status()
-        return response.content
+    response = await _get_client().post(
+        TTS_URL,
+        json={
+            "model": TTS_MODEL,
+            "input": text,
+            "voice": TTS_VOICE,
+            "response_format": TTS_FORMAT,
+        },
+    )
+    response.raise_for_status()
+    return response.content